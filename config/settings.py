@@ -69,7 +69,13 @@ VIDEO_SETTINGS = {
     "transition_duration": 0.8,
     "enable_ken_burns": True,
     "enable_background_music": True,
-    "music_volume": 0.1
+    "music_volume": 0.1,
+    "ffmpeg_threads": 0,                 # Số luồng ffmpeg khi encode (0 = tự động dùng tất cả các nhân)
+    "scene_render_workers": 1,           # Số scene được render song song (mỗi scene một tiến trình ffmpeg, tốn thêm bộ nhớ)
+    "scene_preset": "medium",            # Preset x264 cho video scene trung gian (preset nhanh hơn làm giảm chất lượng video cuối)
+    "audio_bitrate": "192k",             # Bitrate AAC khi xuất video
+    "image_download_workers": 5,         # Số ảnh ứng viên (điểm cao nhất) được tải song song cho mỗi scene
+    "image_downloads_per_host": 3        # Số lượt tải ảnh đồng thời tối đa tới cùng một host (tránh bị chặn/timeout)
 }
 
 # Cấu hình YouTube
@@ -87,5 +93,12 @@ VOICE_SETTINGS = {
     "stability": 0.5,
     "similarity_boost": 0.75,
     "style": 0.0,  # Giọng đọc tin tức trung tính
-    "use_speaker_boost": True
+    "use_speaker_boost": True,
+    "tts_cache_max_mb": 500,  # Dung lượng tối đa của cache giọng nói trên đĩa (MB), xóa file ít dùng nhất khi vượt quá
+    "tts_cache_ttl_days": 30,  # Thời hạn lưu file trong cache giọng nói (ngày), file quá hạn bị xóa khi khởi động
+    "max_concurrent_requests": 3,  # Số request TTS gửi song song (theo giới hạn đồng thời của gói API)
+    "requests_per_second": 2,  # Tốc độ gửi request TTS trung bình tối đa
+    "request_burst": 8,  # Số request TTS được gửi dồn liền nhau trước khi bị giới hạn tốc độ
+    "tts_split_threshold": 800,  # Kịch bản đầy đủ dài hơn số ký tự này được tách nhỏ để tổng hợp song song
+    "tts_chunk_chars": 500  # Độ dài tối đa (ký tự) của mỗi đoạn khi tách, ngắt tại cuối câu
 }
\ No newline at end of file
@@ -8,7 +8,6 @@ from src.news_scraper import NewsScraper
 from src.script_generator import ScriptGenerator
 from src.image_generator import ImageGenerator
 from src.voice_generator import VoiceGenerator
-from src.video_editor import VideoEditor
 from config.settings import OUTPUT_DIR, TEMP_DIR, ASSETS_DIR
 
 # Setup logging
@@ -209,6 +208,8 @@ def main():
     
     # Create video from images and audio
     try:
+        # Imported here because moviepy is slow to load and only needed for this last step
+        from src.video_editor import VideoEditor
         video_editor = VideoEditor()
         
         # Find default background music if available
@@ -1,7 +1,10 @@
 # src/image_generator.py
 
 import os
+import re
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 import time
 import json
@@ -9,8 +12,19 @@ import random
 import hashlib
 import shutil
 import glob
+import heapq
+import operator
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import API keys and settings
 from config.credentials import SERPER_API_KEY, OPENAI_API_KEY
@@ -20,6 +34,101 @@ from config.settings import TEMP_DIR, ASSETS_DIR, VIDEO_SETTINGS
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Browser-like headers for image hosts (some refuse requests without them)
+_IMAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9', # Prioritize US English
+    'Referer': 'https://www.google.com/' # Common referer
+}
+
+# One pooled session shared by all Serper, OpenAI and image requests (and download threads),
+# so keep-alive connections are reused instead of a new TCP/TLS handshake per request
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    # At most one reconnect, so a dead host fails fast instead of burning every retry on connect timeouts
+    max_retries=Retry(total=2, connect=1, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+)
+
+# Timeouts are (connect, read): an unreachable host is abandoned after CONNECT_TIMEOUT seconds,
+# while the read timeout still allows slow but live servers to finish
+CONNECT_TIMEOUT = 3
+_SESSION.mount("https://", _adapter)
+_SESSION.mount("http://", _adapter)
+
+def _dumps(obj):
+    """Serializes a request body to JSON bytes (orjson when installed)."""
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode('utf-8')
+
+def _loads(data):
+    """Parses a JSON response body (orjson when installed)."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+# Problematic image hosts to avoid, and stock/quality sources that earn a score bonus.
+# Each list is matched against the lower-cased URL in a single regex scan.
+_BLACKLISTED_DOMAINS_RE = re.compile("|".join(map(re.escape, ["lookaside.fbsbx.com", "lookaside.instagram.com", "fbcdn"])))
+_QUALITY_DOMAINS_RE = re.compile("|".join(map(re.escape, ["shutterstock", "getty", "unsplash", "pexels", "stock", "adobe"])))
+
+# How long an image URL that failed to download is skipped in later searches (seconds)
+FAILED_URL_TTL = 6 * 3600
+
+# How long Serper image search results are reused from the disk cache (seconds)
+SEARCH_CACHE_TTL = 24 * 3600
+
+# Caps concurrent downloads per image host so parallel candidate fetches don't trip rate limits
+_HOST_SLOTS = defaultdict(lambda: threading.BoundedSemaphore(max(1, VIDEO_SETTINGS.get("image_downloads_per_host", 3))))
+_HOST_SLOTS_LOCK = threading.Lock()
+
+def _host_slot(url):
+    """Returns the semaphore limiting concurrent downloads from the URL's host."""
+    with _HOST_SLOTS_LOCK:
+        return _HOST_SLOTS[urlparse(url).netloc.lower()]
+
+# Hosts that fail HOST_FAILURE_LIMIT downloads in a row are skipped for HOST_BLOCK_TTL seconds
+HOST_FAILURE_LIMIT = 3
+HOST_BLOCK_TTL = 3600
+_host_failures = {}  # host -> consecutive failed downloads
+_host_blocked_until = {}  # host -> expiry time
+_host_lock = threading.Lock()
+
+def _is_host_blocked(url):
+    """Returns True if the URL's host is temporarily blacklisted after repeated failures."""
+    host = urlparse(url).netloc.lower()
+    with _host_lock:
+        expiry = _host_blocked_until.get(host)
+        if expiry is None:
+            return False
+        if expiry > time.time():
+            return True
+        del _host_blocked_until[host]
+        return False
+
+def _record_host_result(url, success):
+    """Updates the consecutive-failure count for the URL's host, blacklisting it at the limit."""
+    host = urlparse(url).netloc.lower()
+    with _host_lock:
+        if success:
+            _host_failures.pop(host, None)
+            return
+        failures = _host_failures.get(host, 0) + 1
+        if failures >= HOST_FAILURE_LIMIT:
+            _host_failures.pop(host, None)
+            _host_blocked_until[host] = time.time() + HOST_BLOCK_TTL
+            logger.info(f"Skipping image host {host} for {HOST_BLOCK_TTL // 60} min after {failures} failed downloads")
+        else:
+            _host_failures[host] = failures
+
+class ImageRejected(Exception):
+    """Raised when a URL answered but its content is unusable (not an image, too small, corrupt).
+
+    These failures are about the image, not the host, so they don't count towards blocking the host.
+    """
+
+class DownloadCancelled(Exception):
+    """Raised when a candidate download is abandoned because another candidate was chosen."""
+
 class ImageGenerator:
     def __init__(self):
         """Initializes ImageGenerator with Serper and OpenAI configurations."""
@@ -45,6 +154,8 @@ class ImageGenerator:
         self.assets_dir = ASSETS_DIR
         self.width = VIDEO_SETTINGS["width"]
         self.height = VIDEO_SETTINGS["height"]
+        # Number of top-ranked candidates fetched in parallel per search
+        self.download_workers = max(1, VIDEO_SETTINGS.get("image_download_workers", 5))
 
         # Serper.dev API URL
         self.serper_url = "https://google.serper.dev/images"
@@ -61,6 +172,18 @@ class ImageGenerator:
         self.cache_dir = os.path.join(self.temp_dir, "image_cache")
         os.makedirs(self.cache_dir, exist_ok=True)
 
+        # Serper results fetched ahead of time in one batch request, keyed by query
+        self._prefetched_searches = {}
+
+        # Serper search results saved on disk so reruns with the same query skip the API call
+        self.search_cache_dir = os.path.join(self.cache_dir, "serper")
+        os.makedirs(self.search_cache_dir, exist_ok=True)
+
+        # Image URLs that recently failed to download (URL hash -> expiry time), loaded on first use
+        self.failed_urls_path = os.path.join(self.cache_dir, "failed_urls.json")
+        self._failed_urls = None
+        self._failed_urls_dirty = False
+
         # Create assets and fonts directories if they don't exist
         os.makedirs(self.assets_dir, exist_ok=True)
         self.fonts_dir = os.path.join(self.assets_dir, "fonts")
@@ -137,7 +260,19 @@ class ImageGenerator:
              logger.info("No source image URL provided in the script.")
 
         # --- 3. Images for Each Scene ---
-        for scene in script.get('scenes', []):
+        scenes = script.get('scenes', [])
+
+        # Generate every search query up front so the image searches can go to Serper as one batch
+        search_queries = {}
+        image_queries = []
+        for index, scene in enumerate(scenes):
+            if scene.get('content'):
+                search_queries[index] = self._create_search_query_with_openai(scene['content'], script['title'])
+                if not (scene.get('prefer_video', False) and VIDEO_SETTINGS.get("enable_video_clips", False)):
+                    image_queries.append(search_queries[index])
+        self._prefetch_image_searches(image_queries)
+
+        for index, scene in enumerate(scenes):
             scene_number = scene.get('number', 'unknown')
             scene_content = scene.get('content', '')
             prefer_video = scene.get('prefer_video', False)  # Thuộc tính được đánh dấu bởi SceneVideoDetector
@@ -151,8 +286,8 @@ class ImageGenerator:
                     logger.warning(f"Scene {scene_number} không có nội dung. Bỏ qua tạo media cho scene này.")
                     continue  # Bỏ qua nếu không có nội dung
 
-                # --- Bước 3.1: Tạo query tìm kiếm ---
-                search_query = self._create_search_query_with_openai(scene_content, script['title'])
+                # --- Bước 3.1: Query tìm kiếm (đã tạo sẵn ở trên) ---
+                search_query = search_queries[index]
                 search_query_used = search_query
 
                 # --- Bước 3.2: Tạo đường dẫn file cho scene ---
@@ -255,6 +390,9 @@ class ImageGenerator:
                 except Exception as fallback_err:
                      logger.critical(f"CRITICAL: Failed even to create emergency fallback image for scene {scene_number}: {fallback_err}", exc_info=True)
 
+        # Drop batch results no scene ended up using
+        self._prefetched_searches.clear()
+
         # --- 4. Outro Card ---
         try:
             outro_image = self._create_outro_card(script['title'], script.get('source', ''), project_dir)
@@ -329,6 +467,100 @@ class ImageGenerator:
         except Exception as e:
             logger.error(f"Lỗi khi lưu metadata tới {output_file}: {e}", exc_info=True)
 
+    def _serper_payload(self, query):
+        """Builds the Serper image search parameters for one query (US/English results)."""
+        return {
+            "q": query,
+            "gl": "us",  # Geo-location: United States
+            "hl": "en",  # Host language: English
+            "num": 20    # Request more results to increase chances of finding a good image
+        }
+
+    def _prefetch_image_searches(self, queries):
+        """Fetches Serper image results for several queries with a single batch request.
+
+        Serper accepts a JSON array of searches and answers with an array of results in the
+        same order. Queries that already have a cached image are skipped, and queries with
+        cached search results are served from disk. On any failure the prefetch is simply
+        dropped and each scene searches on its own.
+
+        Args:
+            queries (list): Search queries for the scenes that will need an image.
+        """
+        self._prefetched_searches.clear()
+        if not self.serper_api_key:
+            return
+
+        pending = []
+        for query in dict.fromkeys(queries):
+            if self._has_cached_image(query):
+                continue
+            cached = self._load_cached_search(query)
+            if cached is not None:
+                self._prefetched_searches[query] = cached
+            else:
+                pending.append(query)
+        if len(pending) < 2:
+            return  # Nothing to gain over the normal single search
+
+        try:
+            logger.info(f"Prefetching Serper image results for {len(pending)} queries in one batch")
+            payload = _dumps([self._serper_payload(q) for q in pending])
+            response = _SESSION.post(self.serper_url, headers=self.serper_headers, data=payload, timeout=(CONNECT_TIMEOUT, 30))
+            if response.status_code != 200:
+                logger.warning(f"Serper batch search failed: {response.status_code}. Searching per scene instead.")
+                return
+
+            data = _loads(response.content)
+            if not isinstance(data, list) or len(data) != len(pending):
+                logger.warning("Unexpected Serper batch response. Searching per scene instead.")
+                return
+
+            for query, result in zip(pending, data):
+                images = result.get("images", [])
+                self._prefetched_searches[query] = images
+                self._save_cached_search(query, images)
+        except Exception as e:
+            logger.warning(f"Serper batch search failed: {str(e)}. Searching per scene instead.")
+
+    def _has_cached_image(self, query):
+        """Returns True if a usable cached image exists for the query."""
+        query_hash = hashlib.md5(query.encode()).hexdigest()
+        try:
+            return os.stat(os.path.join(self.cache_dir, f"{query_hash}.jpg")).st_size > 1024
+        except OSError:
+            return False
+
+    def _search_cache_path(self, query):
+        """Path of the cached Serper results for a query (keyed by the full search parameters)."""
+        key = hashlib.blake2b(json.dumps(self._serper_payload(query), sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.search_cache_dir, f"{key}.json")
+
+    def _load_cached_search(self, query):
+        """Returns cached Serper image results for the query, or None if missing or expired."""
+        path = self._search_cache_path(query)
+        try:
+            if time.time() - os.stat(path).st_mtime > SEARCH_CACHE_TTL:
+                return None
+            with open(path, 'rb') as f:
+                images = _loads(f.read())
+        except (OSError, ValueError):
+            return None
+        return images if isinstance(images, list) else None
+
+    def _save_cached_search(self, query, images):
+        """Saves Serper image results for the query; empty results are not cached."""
+        if not images:
+            return
+        path = self._search_cache_path(query)
+        try:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(_dumps(images))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save Serper search cache: {e}")
+
     def _search_and_download_image(self, query, output_path):
         """Searches for and downloads an image using the Serper.dev API for US/English results.
 
@@ -348,56 +580,71 @@ class ImageGenerator:
         try:
             logger.info(f"Searching images with Serper (US/EN): '{query}'")
 
-            # Payload for US/English search
-            payload = json.dumps({
-                "q": query,
-                "gl": "us",  # Geo-location: United States
-                "hl": "en",  # Host language: English
-                "num": 20    # Request more results to increase chances of finding a good image
-            })
+            # Use results from the batch prefetch or the disk cache when available, otherwise search now
+            image_results = self._prefetched_searches.pop(query, None)
+            if image_results is None:
+                image_results = self._load_cached_search(query)
+            if image_results is None:
+                payload = _dumps(self._serper_payload(query))
 
-            response = requests.post(self.serper_url, headers=self.serper_headers, data=payload, timeout=15)
+                response = _SESSION.post(self.serper_url, headers=self.serper_headers, data=payload, timeout=(CONNECT_TIMEOUT, 15))
 
-            if response.status_code != 200:
-                logger.error(f"Serper API error: {response.status_code}, {response.text}")
-                raise Exception(f"Serper API error: {response.status_code}")
+                if response.status_code != 200:
+                    logger.error(f"Serper API error: {response.status_code}, {response.text}")
+                    raise Exception(f"Serper API error: {response.status_code}")
 
-            data = response.json()
-            image_results = data.get("images", [])
+                data = _loads(response.content)
+                image_results = data.get("images", [])
+                self._save_cached_search(query, image_results)
 
             if not image_results:
                 logger.warning(f"No images found by Serper for query: '{query}'")
                 raise Exception("No images found")
 
-            # Define problematic domains to avoid
-            blacklisted_domains = ["lookaside.fbsbx.com", "lookaside.instagram.com", "fbcdn"]
-            
             # Add log to show the total number of images found before filtering
             logger.info(f"Found {len(image_results)} images from Serper API. Starting scoring process...")
                 
             # Filter and score potential images based on size and aspect ratio
             potential_images = []
             logger.info("=== Scoring all images from search results ===")
+
+            # Target ratio and size are the same for every image; compute them once
+            target_ratio = self.width / self.height
+            size_norm = self.width * self.height * 1.5
+            # Bind lookups used for every result once, outside the loop
+            is_blacklisted = _BLACKLISTED_DOMAINS_RE.search
+            is_quality = _QUALITY_DOMAINS_RE.search
+            is_failed_url = self._is_failed_url
             
             for i, img_data in enumerate(image_results):
                 # CORRECTION: Use proper Serper API property names (imageWidth/imageHeight instead of width/height)
-                width = img_data.get("imageWidth", 0)
-                height = img_data.get("imageHeight", 0)
-                url = img_data.get("imageUrl")
+                get = img_data.get
+                width = get("imageWidth", 0)
+                height = get("imageHeight", 0)
+                url = get("imageUrl")
                 
                 # Skip images without URLs
                 if not url:
-                    logger.debug(f"Image {i+1} skipped - No URL provided")
+                    logger.debug("Image %d skipped - No URL provided", i + 1)
                     continue
                     
                 # Skip known problematic domains
-                if any(domain in url.lower() for domain in blacklisted_domains):
-                    logger.debug(f"Image {i+1} skipped - Blacklisted domain: {url[:80]}...")
+                url_lower = url.lower()
+                if is_blacklisted(url_lower):
+                    logger.debug("Image %d skipped - Blacklisted domain: %.80s...", i + 1, url)
+                    continue
+
+                # Skip URLs that failed to download recently, and hosts that keep failing
+                if _is_host_blocked(url):
+                    logger.debug("Image %d skipped - Host failing repeatedly: %.80s...", i + 1, url)
+                    continue
+                if is_failed_url(url):
+                    logger.debug("Image %d skipped - Failed recently: %.80s...", i + 1, url)
                     continue
                 
                 # Filter out very small images if dimensions are provided
                 if width != 0 and height != 0 and (width < 400 or height < 300):
-                    logger.debug(f"Image {i+1} skipped - Too small: {width}x{height}")
+                    logger.debug("Image %d skipped - Too small: %sx%s", i + 1, width, height)
                     continue
 
                 # Calculate score even if dimensions are not provided
@@ -407,12 +654,11 @@ class ImageGenerator:
                 if width > 0 and height > 0:
                     # Only calculate dimension-based score if dimensions are provided
                     ratio = width / height if height > 0 else 0
-                    target_ratio = self.width / self.height
                     ratio_diff = abs(ratio - target_ratio)
 
                     # Calculate a score based on size and aspect ratio match
                     # Normalize size score relative to target video size (e.g., 1920x1080)
-                    size_score = min((width * height) / (self.width * self.height * 1.5), 1.0)  # Favor larger images, cap at 1.0
+                    size_score = min((width * height) / size_norm, 1.0)  # Favor larger images, cap at 1.0
                     score_components.append(f"Size: {size_score:.2f}")
                     
                     # Score higher for aspect ratios closer to the target
@@ -423,19 +669,18 @@ class ImageGenerator:
                     score = (size_score * 0.6) + (ratio_score * 0.4)  # 60% size, 40% ratio
                 
                 # Give bonus for high-quality sources
-                quality_domains = ["shutterstock", "getty", "unsplash", "pexels", "stock", "adobe"]
                 domain_bonus = 0
-                for domain in quality_domains:
-                    if domain in url.lower():
-                        domain_bonus = 0.2
-                        score_components.append(f"Quality domain bonus: +0.2")
-                        break
+                if is_quality(url_lower):
+                    domain_bonus = 0.2
+                    score_components.append(f"Quality domain bonus: +0.2")
                         
                 score += domain_bonus
                 score = min(score, 1.0)  # Cap at 1.0
 
                 # Log detailed scoring information
-                logger.info(f"Image {i+1}: Score={score:.2f} [{', '.join(score_components)}], Size={width}x{height}, URL={url[:80]}...")
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Image %d: Score=%.2f [%s], Size=%sx%s, URL=%.80s...",
+                                i + 1, score, ", ".join(score_components), width, height, url)
 
                 potential_images.append({"url": url, "score": score, "width": width, "height": height})
 
@@ -448,32 +693,57 @@ class ImageGenerator:
                 if not potential_images:
                     raise Exception("No images with URLs found even in raw results")
 
-            # Sort images by score, highest first
-            potential_images.sort(key=lambda x: x["score"], reverse=True)
+            # Only the best 5 images are tried, so select them instead of sorting everything
+            # (highest first; ties keep their search-result order)
+            candidates = heapq.nlargest(5, potential_images, key=operator.itemgetter("score"))
             
-            # Log the sorted results
-            logger.info("=== Sorted images by score (highest first) ===")
-            for i, img in enumerate(potential_images[:5]):  # Log top 5 for brevity
-                logger.info(f"Rank {i+1}: Score={img['score']:.2f}, Size={img['width']}x{img['height']}, URL={img['url'][:80]}...")
+            # Log the top results
+            logger.info("=== Top images by score (highest first) ===")
+            for i, img in enumerate(candidates):
+                logger.info("Rank %d: Score=%.2f, Size=%sx%s, URL=%.80s...", i + 1, img["score"], img["width"], img["height"], img["url"])
             
-            logger.info(f"Starting download attempts from highest scored images...")
+            logger.info("Starting download attempts from highest scored images...")
 
-            # Attempt to download the top-ranked images
-            max_attempts = min(5, len(potential_images)) # Try the best 5 images
-            for i in range(max_attempts):
-                selected_image = potential_images[i]
-                image_url = selected_image["url"]
-                logger.info(f"Attempting download {i+1}/{max_attempts} (Score: {selected_image['score']:.2f}, Size: {selected_image['width']}x{selected_image['height']}): {image_url[:70]}...")
+            # Fetch the top-ranked images in parallel, then take the best-ranked one that succeeded
+            max_attempts = len(candidates) # Try the best 5 images
+            executor = ThreadPoolExecutor(max_workers=min(self.download_workers, max_attempts))
+            cancel_event = threading.Event()
+            try:
+                futures = [executor.submit(self._fetch_image, img["url"], cancel_event) for img in candidates]
+                for i, (selected_image, future) in enumerate(zip(candidates, futures)):
+                    image_url = selected_image["url"]
+                    logger.info("Attempting download %d/%d (Score: %.2f, Size: %sx%s): %.70s...",
+                                i + 1, max_attempts, selected_image["score"], selected_image["width"], selected_image["height"], image_url)
 
-                try:
-                    # Use the dedicated download/process function
-                    downloaded_path = self._download_and_process_image(image_url, output_path)
-                    if downloaded_path:
-                        logger.info(f"Successfully downloaded and processed image {i+1}.")
-                        return downloaded_path # Return immediately on success
-                except Exception as download_err:
-                    logger.warning(f"Failed attempt {i+1} for {image_url}: {str(download_err)}")
-                    # Don't raise here; the loop will try the next image
+                    try:
+                        image = future.result()
+                    except ImageRejected as reject_err:
+                        # Unusable content or a definitive 4xx: remember the URL so later searches
+                        # don't try it again, but don't count it against the host
+                        logger.warning("Failed attempt %d for %s: %s", i + 1, image_url, reject_err)
+                        self._mark_failed_url(image_url)
+                        continue
+                    except Exception as download_err:
+                        # Transient errors (timeouts, resets, 403/429/5xx) may clear up, so the URL is not
+                        # remembered; the host tracker handles hosts that keep failing
+                        logger.warning("Failed attempt %d for %s: %s", i + 1, image_url, download_err)
+                        _record_host_result(image_url, success=False)
+                        continue
+
+                    _record_host_result(image_url, success=True)
+
+                    try:
+                        self._save_processed_image(image, output_path)
+                        logger.info("Successfully downloaded and processed image %d.", i + 1)
+                        return output_path # Return immediately on success
+                    except Exception as save_err:
+                        logger.warning("Failed attempt %d for %s: %s", i + 1, image_url, save_err)
+            finally:
+                # Lower-ranked downloads are not needed any more: drop queued ones and tell
+                # running ones to stop reading/decoding so they release their host slots
+                cancel_event.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._save_failed_urls()
 
             # If all download attempts fail
             logger.error(f"All {max_attempts} download attempts failed for query: '{query}'")
@@ -483,6 +753,46 @@ class ImageGenerator:
             logger.error(f"Error during image search/download for query '{query}': {str(e)}", exc_info=True)
             raise # Re-raise the exception for fallback mechanisms to handle
 
+    def _load_failed_urls(self):
+        """Loads the failed-URL cache from disk once, dropping expired entries."""
+        if self._failed_urls is None:
+            try:
+                with open(self.failed_urls_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+            now = time.time()
+            self._failed_urls = {key: expiry for key, expiry in entries.items() if expiry > now}
+            self._failed_urls_dirty = len(self._failed_urls) != len(entries)
+        return self._failed_urls
+
+    def _url_key(self, url):
+        """Short stable hash of a URL used as the cache key."""
+        return hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _is_failed_url(self, url):
+        """Returns True if the URL failed to download within the last FAILED_URL_TTL seconds."""
+        expiry = self._load_failed_urls().get(self._url_key(url))
+        return expiry is not None and expiry > time.time()
+
+    def _mark_failed_url(self, url):
+        """Records a failed download so the URL is skipped for FAILED_URL_TTL seconds."""
+        self._load_failed_urls()[self._url_key(url)] = time.time() + FAILED_URL_TTL
+        self._failed_urls_dirty = True
+
+    def _save_failed_urls(self):
+        """Writes the failed-URL cache to disk if it changed."""
+        if not self._failed_urls_dirty:
+            return
+        try:
+            tmp_path = self.failed_urls_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._failed_urls, f)
+            os.replace(tmp_path, self.failed_urls_path)
+            self._failed_urls_dirty = False
+        except OSError as e:
+            logger.warning(f"Could not save failed image URL cache: {e}")
+
     def _download_and_process_image(self, image_url, output_path):
         """Downloads, validates, and processes (resize/crop) an image from a URL.
 
@@ -496,59 +806,108 @@ class ImageGenerator:
         Raises:
             Exception: If downloading, validation, or processing fails.
         """
+        image = self._fetch_image(image_url)
         try:
-            # Use headers to mimic a browser
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9', # Prioritize US English
-                'Referer': 'https://www.google.com/' # Common referer
-            }
-            # Use stream=True to check headers before downloading full content
-            response = requests.get(image_url, headers=headers, timeout=20, stream=True)
-            response.raise_for_status() # Raise HTTPError for bad status codes (4xx or 5xx)
-
-            # Check Content-Type header
-            content_type = response.headers.get('Content-Type', '').lower()
-            if not content_type.startswith('image/'):
-                 # Allow common image types sometimes served with different content types
-                if 'webp' in content_type or 'avif' in content_type or 'octet-stream' in content_type:
-                     logger.debug(f"Content-Type is '{content_type}', proceeding as image.")
-                else:
-                    raise Exception(f"Invalid Content-Type: {content_type}")
+            self._save_processed_image(image, output_path)
+        except Exception as e:
+            raise Exception(f"Failed to download/process image {image_url}: {str(e)}")
+        return output_path
+
+    def _fetch_image(self, image_url, cancel_event=None):
+        """Downloads and validates an image from a URL.
+
+        Safe to call from worker threads: it only touches the network and memory.
+
+        Args:
+            image_url (str): The URL of the image.
+            cancel_event (threading.Event, optional): When set, the download is abandoned
+                between chunks and before decoding.
+
+        Returns:
+            PIL.Image.Image: The decoded image in RGB mode.
+
+        Raises:
+            ImageRejected: If the URL answered but the image is unusable.
+            DownloadCancelled: If cancel_event was set before the image was decoded.
+            Exception: If the download itself fails (network or server error).
+        """
+        cancelled = cancel_event.is_set if cancel_event is not None else lambda: False
+        try:
+            with _host_slot(image_url):
+                if cancelled():
+                    raise DownloadCancelled(image_url)
+
+                # Use stream=True to check headers before downloading full content
+                response = _SESSION.get(image_url, headers=_IMAGE_HEADERS, timeout=(CONNECT_TIMEOUT, 20), stream=True)
+                response.raise_for_status() # Raise HTTPError for bad status codes (4xx or 5xx)
+
+                # Check Content-Type header
+                content_type = response.headers.get('Content-Type', '').lower()
+                if not content_type.startswith('image/'):
+                     # Allow common image types sometimes served with different content types
+                    if 'webp' in content_type or 'avif' in content_type or 'octet-stream' in content_type:
+                         logger.debug("Content-Type is '%s', proceeding as image.", content_type)
+                    else:
+                        raise ImageRejected(f"Invalid Content-Type: {content_type}")
+
+                # Read the body in chunks and check the size as soon as the header has arrived,
+                # so images that are too small are aborted before the rest of the file is downloaded
+                image_data = bytearray()
+                size_checked = False
+                try:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        if cancelled():
+                            raise DownloadCancelled(image_url)
+                        image_data += chunk
+                        if not size_checked:
+                            try:
+                                # open() only parses the header; pixel data is not decoded
+                                width, height = Image.open(BytesIO(image_data)).size
+                            except Exception:
+                                continue # Header not complete yet
+                            if width < 300 or height < 200:
+                                raise ImageRejected(f"Image dimensions too small: {width}x{height}")
+                            size_checked = True
+                finally:
+                    response.close()
 
-            # Read the image data from the response
-            image_data = response.content
             if not image_data:
-                 raise Exception("Downloaded image data is empty")
+                 raise ImageRejected("Downloaded image data is empty")
+
+            if cancelled():
+                raise DownloadCancelled(image_url)
 
             # Validate and open the image using Pillow
             try:
                 image = Image.open(BytesIO(image_data))
-                # Verify integrity (detects some truncated files)
-                # Note: verify() can be problematic with some formats, use cautiously or remove if issues arise
-                # image.verify()
-                # Re-open after verify/or if verify is skipped
-                image = Image.open(BytesIO(image_data))
+                # Large JPEGs are decoded straight at a reduced DCT scale; draft never goes below
+                # the requested size, so the crop/resize to the video frame loses no quality
+                image.draft('RGB', (self.width, self.height))
                 # Convert to RGB to ensure consistency (handles transparency, palettes)
                 if image.mode != 'RGB':
-                     logger.debug(f"Converting image from mode {image.mode} to RGB.")
+                     logger.debug("Converting image from mode %s to RGB.", image.mode)
                      image = image.convert('RGB')
+                else:
+                     image.load() # Decode here (in the worker thread) and surface corrupt data now
             except Exception as img_err:
-                raise Exception(f"Invalid or corrupted image data: {str(img_err)}")
+                raise ImageRejected(f"Invalid or corrupted image data: {str(img_err)}")
 
             # Check minimum dimensions after opening
             if image.width < 300 or image.height < 200:
-                raise Exception(f"Image dimensions too small: {image.width}x{image.height}")
-
-            # Resize and crop the image to fit video dimensions
-            processed_image = self._resize_image(image)
-
-            # Save the processed image as JPEG with good quality
-            processed_image.save(output_path, "JPEG", quality=90)
-            logger.debug(f"Image saved to: {output_path}")
-            return output_path
-
+                raise ImageRejected(f"Image dimensions too small: {image.width}x{image.height}")
+
+            return image
+
+        except DownloadCancelled:
+             raise
+        except ImageRejected as rejected:
+             raise ImageRejected(f"Failed to download/process image {image_url}: {str(rejected)}")
+        except requests.exceptions.HTTPError as http_err:
+             # Missing images (404 etc.) are a problem of this URL; 403/429/5xx point at the host
+             status = http_err.response.status_code if http_err.response is not None else None
+             if status is not None and status < 500 and status not in (403, 429):
+                 raise ImageRejected(f"HTTP {status} downloading {image_url}")
+             raise Exception(f"Network error downloading {image_url}: {str(http_err)}")
         except requests.exceptions.RequestException as req_err:
              # Catch network-related errors
              raise Exception(f"Network error downloading {image_url}: {str(req_err)}")
@@ -557,6 +916,15 @@ class ImageGenerator:
              # logger.error(f"Error processing image {image_url}: {str(e)}", exc_info=True) # Log details if needed
              raise Exception(f"Failed to download/process image {image_url}: {str(e)}")
 
+    def _save_processed_image(self, image, output_path):
+        """Resizes/crops an image to the video dimensions and saves it as JPEG."""
+        # Resize and crop the image to fit video dimensions
+        processed_image = self._resize_image(image)
+
+        # Save the processed image as JPEG with good quality
+        processed_image.save(output_path, "JPEG", quality=90)
+        logger.debug(f"Image saved to: {output_path}")
+
 
     # These validation helpers are less critical now as validation is integrated into download/process
     # def _validate_image(self, image_data): ...
@@ -568,10 +936,15 @@ class ImageGenerator:
         cache_filename = f"{query_hash}.jpg"
         cache_path = os.path.join(self.cache_dir, cache_filename)
 
-        if os.path.exists(cache_path):
+        try:
+            cache_size = os.stat(cache_path).st_size
+        except OSError:
+            cache_size = None
+
+        if cache_size is not None:
             # Basic check for validity (e.g., file size > 0 bytes or a threshold)
             try:
-                if os.path.getsize(cache_path) > 1024: # Check if file size is > 1KB
+                if cache_size > 1024: # Check if file size is > 1KB
                     logger.info(f"Using cached image for query: '{query}'")
                     shutil.copy(cache_path, output_path)
                     return output_path
@@ -955,8 +1328,8 @@ class ImageGenerator:
                 "max_tokens": 30    # Limit tokens for concise query
             }
 
-            logger.debug(f"Calling OpenAI for search query generation: {scene_content[:100]}...")
-            response = requests.post(url, headers=self.openai_headers, json=payload, timeout=15)
+            logger.debug("Calling OpenAI for search query generation: %.100s...", scene_content)
+            response = _SESSION.post(url, headers=self.openai_headers, json=payload, timeout=(CONNECT_TIMEOUT, 15))
 
             if response.status_code == 200:
                 data = response.json()
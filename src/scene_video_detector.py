@@ -14,6 +14,12 @@ from config.settings import VIDEO_SETTINGS
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Whole-script results, keyed by the scene contents and the distribution settings
+SCRIPT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "../temp/scene_analysis_cache/scripts")
+
+# Per-scene fields written by SceneVideoDetector.analyze_script
+ANNOTATION_FIELDS = ("video_score", "video_reason", "prefer_video", "analysis_method")
+
 class SceneVideoDetector:
     """
     Class to detect which scenes would benefit from video clips using OpenAI API,
@@ -356,10 +362,56 @@ class SceneVideoDetector:
 
 # Integration with script_generator.py
 
+def _script_cache_path(scenes: List[Dict]) -> str:
+    """Cache file for a whole script's annotations."""
+    key_source = "\n".join(f"{scene.get('number', 0)}|{scene.get('content', '')}" for scene in scenes)
+    key_source += f"\n{VIDEO_SETTINGS.get('video_clip_frequency', 0.5)}|{VIDEO_SETTINGS.get('min_scenes_between_videos', 1)}"
+    key = hashlib.blake2b(key_source.encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(SCRIPT_CACHE_DIR, f"{key}.json")
+
+
+def _load_script_annotations(scenes: List[Dict], cache_file: str) -> bool:
+    """Merge cached annotations into the scenes. Returns True on a cache hit."""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            annotations = json.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.warning(f"Error reading cache file {cache_file}: {str(e)}")
+        return False
+    
+    if len(annotations) != len(scenes):
+        return False
+    for scene, fields in zip(scenes, annotations):
+        scene.update(fields)
+    return True
+
+
+def _save_script_annotations(scenes: List[Dict], cache_file: str) -> None:
+    """Store the annotations of a fully analyzed script."""
+    # Scenes that fell back after an API error should be analyzed again next time
+    if any(scene.get("analysis_method") == "api_fallback" for scene in scenes):
+        return
+    
+    annotations = [{field: scene[field] for field in ANNOTATION_FIELDS if field in scene} for scene in scenes]
+    try:
+        os.makedirs(SCRIPT_CACHE_DIR, exist_ok=True)
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(annotations, f)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        logger.warning(f"Error writing to cache file {cache_file}: {str(e)}")
+
+
 def enhance_script_with_video_annotations(script):
     """
     Analyze script and determine which scenes should use video clips.
     
+    Results for a script whose scenes were analyzed before are read back from
+    a single cache file instead of being re-analyzed scene by scene.
+    
     Args:
         script (dict): The script generated by script_generator
         
@@ -374,6 +426,12 @@ def enhance_script_with_video_annotations(script):
             for scene in script.get("scenes", []):
                 scene["prefer_video"] = False
             return script
+        
+        scenes = script.get("scenes", [])
+        cache_file = _script_cache_path(scenes) if scenes else None
+        if cache_file and _load_script_annotations(scenes, cache_file):
+            logger.info(f"Using cached video analysis for {len(scenes)} scenes")
+            return script
             
         # Initialize detector
         detector = SceneVideoDetector()
@@ -381,6 +439,9 @@ def enhance_script_with_video_annotations(script):
         # Analyze script
         enhanced_script = detector.analyze_script(script)
         
+        if cache_file:
+            _save_script_annotations(enhanced_script.get("scenes", []), cache_file)
+        
         return enhanced_script
         
     except Exception as e:
@@ -1,12 +1,27 @@
 # src/script_generator.py
 import os
+import re
 import sys
 import logging
 import time
 import json
+import hashlib
+import tempfile
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from src.scene_video_detector import enhance_script_with_video_annotations
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
 # Thêm thư mục gốc vào sys.path
 if __name__ == "__main__":
@@ -21,68 +36,63 @@ from config.settings import TEMP_DIR
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class ScriptGenerator:
-    def __init__(self):
-        """Khởi tạo ScriptGenerator"""
-        self.temp_dir = TEMP_DIR
-        self.api_key = OPENAI_API_KEY
-        
-        if not self.api_key:
-            logger.error("API key của OpenAI không được cung cấp")
-            raise ValueError("API key không hợp lệ")
-        
-        # Cấu hình API
-        self.base_url = "https://api.openai.com/v1"
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Tạo thư mục lưu trữ tạm thời
-        os.makedirs(self.temp_dir, exist_ok=True)
+# Tăng khi logic _parse_scenes thay đổi để các scene trong cache được phân tích lại
+SCRIPT_CACHE_VERSION = 3
+
+# Giới hạn độ dài nội dung bài báo đưa vào prompt để tiết kiệm token
+MAX_CONTENT_TOKENS = 2500
+# Dùng khi không có tiktoken (~4 ký tự tiếng Anh cho mỗi token)
+MAX_CONTENT_CHARS = 10000
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+def _get_encoding():
+    """Lấy tokenizer của gpt-4o (chỉ nạp một lần), hoặc None nếu không dùng được tiktoken"""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded and tiktoken is not None:
+            try:
+                _encoding = tiktoken.encoding_for_model("gpt-4o")
+            except Exception as e:
+                # Lần đầu tiktoken cần tải bảng BPE, có thể lỗi khi không có mạng
+                logger.warning(f"Không thể nạp tokenizer, cắt nội dung theo ký tự: {str(e)}")
+        _encoding_loaded = True
+    return _encoding
+
+def _truncate_content(content):
+    """Cắt nội dung bài báo theo số token thực tế của model, hoặc theo ký tự nếu không có tokenizer"""
+    encoding = _get_encoding()
+    if encoding is None:
+        if len(content) > MAX_CONTENT_CHARS:
+            return content[:MAX_CONTENT_CHARS] + "..."
+        return content
     
-    def generate_script(self, article, style="informative"):
-        """Tạo kịch bản từ bài báo
-        
-        Args:
-            article (dict): Bài báo với các khóa title, content, url, v.v.
-            style (str): Phong cách kịch bản (informative, conversational, dramatic, controversial)
-            
-        Returns:
-            dict: Kịch bản đã tạo bao gồm full_script và danh sách các scenes
-        """
-        styles = {
-            "informative": "formal and professional, like a news anchor",
-            "conversational": "friendly and engaging, like in a podcast",
-            "dramatic": "impactful and attention-grabbing, while maintaining accuracy",
-            "controversial": "provocative and debate-sparking, highlighting conflicting viewpoints and tensions"
-        }
-        
-        style_prompt = styles.get(style, styles["informative"])
-        
-        try:
-            # Chuẩn bị nội dung bài báo
-            title = article.get('title', '')
-            content = article.get('content', '')
-            
-            if not title or not content:
-                logger.error("Article doesn't have title or content")
-                return None
-            
-            # Giới hạn độ dài nội dung để tiết kiệm token
-            max_content_length = 10000
-            if len(content) > max_content_length:
-                content = content[:max_content_length] + "..."
-            
-            # Tạo prompt dựa vào phong cách được chọn
-            if style == "controversial":
-                prompt = f"""
-                Create a highly controversial news script based on the following article. The script should generate debate, provoke strong reactions, and maximize viewer engagement:
+    tokens = encoding.encode(content)
+    if len(tokens) > MAX_CONTENT_TOKENS:
+        return encoding.decode(tokens[:MAX_CONTENT_TOKENS]) + "..."
+    return content
+
+# Mọi dòng bắt đầu bằng "#SCENE" là dòng đánh dấu phân cảnh ("#SCENE N#", dấu # cuối có thể thiếu)
+_SCENE_TAG_RE = re.compile(r'^[^\S\n]*#SCENE(.*)$', re.MULTILINE)
+# Khoảng trắng quanh xuống dòng và các dòng trống bên trong nội dung phân cảnh
+_LINE_BREAK_RE = re.compile(r'\s*\n\s*')
+
+# Mô tả giọng văn cho từng phong cách kịch bản
+_STYLE_PROMPTS = {
+    "informative": "formal and professional, like a news anchor",
+    "conversational": "friendly and engaging, like in a podcast",
+    "dramatic": "impactful and attention-grabbing, while maintaining accuracy",
+    "controversial": "provocative and debate-sparking, highlighting conflicting viewpoints and tensions"
+}
+
+# Bài báo luôn nằm ở cuối prompt: phần hướng dẫn cố định phía trước giống hệt nhau giữa các lần gọi
+# nên được OpenAI cache theo tiền tố (giảm token đầu vào tính phí và độ trễ)
+# Prompt cho phong cách gây tranh cãi
+_CONTROVERSIAL_PROMPT = """
+                Create a highly controversial news script based on the article below. The script should generate debate, provoke strong reactions, and maximize viewer engagement:
                 
-                TITLE: {title}
-                                
-                CONTENT: {content}
-                                
                 Script requirements:
                 1. Start with a shocking statement or question that challenges mainstream views
                 2. Frame the topic as a heated debate between opposing sides
@@ -107,15 +117,15 @@ class ScriptGenerator:
                 End with a final scene that poses a provocative question to spark debate.
 
                 Each scene must be clearly numbered and separated by empty lines.
-                """
-            else:
-                # Prompt gốc cho các phong cách khác
-                prompt = f"""
-                Create a news script with a {style_prompt} tone based on the following article:
                 
                 TITLE: {title}
                 
                 CONTENT: {content}
+                """
+
+# Prompt gốc cho các phong cách khác
+_STANDARD_PROMPT = """
+                Create a news script with a {style_prompt} tone based on the article below:
                 
                 Script requirements:
                 1. Short introduction (15-20 words)
@@ -137,100 +147,324 @@ class ScriptGenerator:
                 [Scene 3 content]
                 
                 ...and continue with additional scenes. Each scene must be clearly numbered and separated by empty lines.
+                
+                TITLE: {title}
+                
+                CONTENT: {content}
                 """
+
+class ScriptGenerator:
+    def __init__(self):
+        """Khởi tạo ScriptGenerator"""
+        self.temp_dir = TEMP_DIR
+        self.api_key = OPENAI_API_KEY
+        
+        if not self.api_key:
+            logger.error("API key của OpenAI không được cung cấp")
+            raise ValueError("API key không hợp lệ")
+        
+        # Cấu hình API
+        self.base_url = "https://api.openai.com/v1"
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        # Dùng chung một session để các lần gọi API tái sử dụng kết nối TCP/TLS
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        
+        # Tạo thư mục lưu trữ tạm thời
+        os.makedirs(self.temp_dir, exist_ok=True)
+        
+        # Cache phản hồi theo nội dung bài báo để không gọi lại API khi chạy lại
+        self.cache_dir = os.path.join(self.temp_dir, "script_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    def close(self):
+        """Đóng session HTTP và giải phóng các kết nối đang giữ"""
+        session = getattr(self, "_session", None)
+        if session is not None:
+            session.close()
+            self._session = None
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+    
+    def generate_script(self, article, style="informative", need_scenes=True):
+        """Tạo kịch bản từ bài báo
+        
+        Args:
+            article (dict): Bài báo với các khóa title, content, url, v.v.
+            style (str): Phong cách kịch bản (informative, conversational, dramatic, controversial)
+            need_scenes (bool): False nếu chỉ cần full_script; khi đó không phân tích phân cảnh
+                và scenes trong kết quả là None
+            
+        Returns:
+            dict: Kịch bản đã tạo bao gồm full_script và danh sách các scenes
+        """
+        style_prompt = _STYLE_PROMPTS.get(style, _STYLE_PROMPTS["informative"])
+        
+        try:
+            # Chuẩn bị nội dung bài báo
+            title = article.get('title', '')
+            content = article.get('content', '')
+            
+            if not title or not content:
+                logger.error("Article doesn't have title or content")
+                return None
+            
+            # Giới hạn độ dài nội dung để tiết kiệm token
+            content = _truncate_content(content)
+            
+            # Tạo prompt dựa vào phong cách được chọn
+            if style == "controversial":
+                prompt = _CONTROVERSIAL_PROMPT.format(title=title, content=content)
+            else:
+                # Prompt gốc cho các phong cách khác
+                prompt = _STANDARD_PROMPT.format(style_prompt=style_prompt, title=title, content=content)
+            
+            payload = self._build_payload(prompt, style)
+            
+            # Cùng một yêu cầu (model, system prompt, prompt, tham số) đã từng được gọi thì dùng lại kết quả;
+            # đổi prompt hay model sẽ tự ra khóa mới nên không dùng nhầm kịch bản cũ
+            cache_key = hashlib.blake2b(
+                json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8'), digest_size=16
+            ).hexdigest()
+            cached = self._load_cached_script(cache_key, need_scenes)
+            if cached:
+                full_script, scenes = cached
+                logger.info(f"Dùng kịch bản trong cache cho bài: {title}")
+                return self._build_script(article, title, full_script, scenes, style)
             
             # Gọi OpenAI API
-            response = self._call_openai_api(prompt, style)
+            full_script, complete = self._call_openai_api(payload)
             
-            if not response:
+            if not full_script:
                 logger.error("Không nhận được phản hồi từ OpenAI API")
                 return None
             
-            # Lấy kịch bản từ phản hồi
-            full_script = response
-            
             # Phân tích kịch bản thành các phân cảnh
-            scenes = self._parse_scenes(full_script)
-            
-            logger.info(f"Đã tạo kịch bản với {len(scenes)} phân cảnh cho bài: {title}")
+            if need_scenes:
+                scenes = self._parse_scenes(full_script)
+                logger.info(f"Đã tạo kịch bản với {len(scenes)} phân cảnh cho bài: {title}")
+            else:
+                scenes = None
+                logger.info(f"Đã tạo kịch bản cho bài: {title}")
             
-            # Tạo script object để trả về
-            script = {
-                "title": title,
-                "full_script": full_script,
-                "scenes": scenes,
-                "source": article.get('source', 'Unknown'),
-                "url": article.get('url', ''),
-                "style": style
-            }
+            # Kịch bản bị cắt ngang thì vẫn dùng cho lần này nhưng không lưu cache
+            if complete:
+                self._save_cached_script(cache_key, full_script, scenes)
+            else:
+                logger.warning(f"Kịch bản chưa hoàn chỉnh (stream bị ngắt hoặc vượt max_tokens), không lưu cache: {title}")
             
-            # Phân tích và đánh dấu các scene nên dùng video
-            try:
-                # Kiểm tra xem tính năng video clips có được bật không
-                from config.settings import VIDEO_SETTINGS
-                if VIDEO_SETTINGS.get("enable_video_clips", False):
-                    logger.info(f"Phân tích {len(scenes)} scene để xác định nên dùng video...")
-                    enhanced_script = enhance_script_with_video_annotations(script)
-                    
-                    # Log kết quả phân tích để debug
-                    video_scenes = sum(1 for scene in enhanced_script.get('scenes', []) if scene.get('prefer_video', False))
-                    logger.info(f"Kết quả phân tích: {video_scenes}/{len(scenes)} scene nên dùng video")
-                    
-                    return enhanced_script
-                else:
-                    logger.info("Tính năng video clips đang bị tắt trong cài đặt")
-                    return script
-            except ImportError as e:
-                logger.warning(f"Không thể import module scene_video_detector: {str(e)}")
-                return script
-            except Exception as e:
-                logger.error(f"Lỗi khi phân tích scene cho video: {str(e)}")
-                return script
+            return self._build_script(article, title, full_script, scenes, style)
             
         except Exception as e:
             logger.error(f"Lỗi khi tạo kịch bản: {str(e)}")
             return None
     
-    def _call_openai_api(self, prompt, style="informative"):
-        """Gọi OpenAI API để tạo kịch bản
+    def _build_script(self, article, title, full_script, scenes, style):
+        """Tạo script object và đánh dấu các scene nên dùng video
         
         Args:
-            prompt (str): Prompt gửi đến OpenAI
+            article (dict): Bài báo gốc
+            title (str): Tiêu đề bài báo
+            full_script (str): Kịch bản đầy đủ
+            scenes (list): Danh sách các phân cảnh, hoặc None nếu không cần
             style (str): Phong cách kịch bản
             
         Returns:
-            str: Phản hồi từ OpenAI, hoặc None nếu có lỗi
+            dict: Kịch bản bao gồm full_script và danh sách các scenes
         """
+        # Tạo script object để trả về
+        script = {
+            "title": title,
+            "full_script": full_script,
+            "scenes": scenes,
+            "source": article.get('source', 'Unknown'),
+            "url": article.get('url', ''),
+            "style": style
+        }
+        
+        # Không có phân cảnh thì không có gì để đánh dấu video
+        if scenes is None:
+            return script
+        
+        # Phân tích và đánh dấu các scene nên dùng video
         try:
-            url = f"{self.base_url}/chat/completions"
+            # Kiểm tra xem tính năng video clips có được bật không
+            from config.settings import VIDEO_SETTINGS
+            if VIDEO_SETTINGS.get("enable_video_clips", False):
+                # Chỉ nạp bộ phân tích khi tính năng được bật
+                from src.scene_video_detector import enhance_script_with_video_annotations
+                logger.info(f"Phân tích {len(scenes)} scene để xác định nên dùng video...")
+                enhanced_script = enhance_script_with_video_annotations(script)
+                
+                # Log kết quả phân tích để debug
+                video_scenes = sum(1 for scene in enhanced_script.get('scenes', []) if scene.get('prefer_video', False))
+                logger.info(f"Kết quả phân tích: {video_scenes}/{len(scenes)} scene nên dùng video")
+                
+                return enhanced_script
+            else:
+                logger.info("Tính năng video clips đang bị tắt trong cài đặt")
+                return script
+        except ImportError as e:
+            logger.warning(f"Không thể import module scene_video_detector: {str(e)}")
+            return script
+        except Exception as e:
+            logger.error(f"Lỗi khi phân tích scene cho video: {str(e)}")
+            return script
+    
+    def _cache_path(self, cache_key):
+        """Đường dẫn file cache của một kịch bản"""
+        return os.path.join(self.cache_dir, f"{cache_key}.json")
+    
+    def _load_cached_script(self, cache_key, need_scenes=True):
+        """Đọc kịch bản đã lưu trong cache
+        
+        Args:
+            cache_key (str): Hash của payload gửi tới OpenAI
+            need_scenes (bool): Có cần danh sách phân cảnh hay không
             
-            # Điều chỉnh system prompt dựa trên phong cách
-            system_content = "You are a professional script writer for news videos."
-            if style == "controversial":
-                system_content = "You are a provocative script writer who creates engaging, debate-sparking news content that presents multiple perspectives in an emotionally charged manner while maintaining factual accuracy."
+        Returns:
+            tuple: (full_script, scenes), hoặc None nếu không có trong cache
+        """
+        try:
+            with open(self._cache_path(cache_key), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            full_script = data['full_script']
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Bỏ qua cache kịch bản bị lỗi {cache_key}: {str(e)}")
+            return None
+        
+        # Logic phân tích đã đổi thì chỉ cần phân tích lại, không cần gọi API
+        if not need_scenes:
+            scenes = None
+        elif data.get('version') != SCRIPT_CACHE_VERSION or data.get('scenes') is None:
+            scenes = self._parse_scenes(full_script)
+            self._save_cached_script(cache_key, full_script, scenes)
+        else:
+            scenes = data['scenes']
+        return full_script, scenes
+    
+    def _save_cached_script(self, cache_key, full_script, scenes):
+        """Lưu kịch bản vào cache (ghi ra file tạm rồi thay thế để tránh file dở dang)"""
+        data = {
+            "version": SCRIPT_CACHE_VERSION,
+            "full_script": full_script,
+            "scenes": scenes
+        }
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._cache_path(cache_key))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Không thể lưu cache kịch bản: {str(e)}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _build_payload(self, prompt, style="informative"):
+        """Tạo payload gửi tới OpenAI
+        
+        Args:
+            prompt (str): Prompt gửi đến OpenAI
+            style (str): Phong cách kịch bản
+            
+        Returns:
+            dict: Payload của yêu cầu chat/completions
+        """
+        # Điều chỉnh system prompt dựa trên phong cách
+        system_content = "You are a professional script writer for news videos."
+        if style == "controversial":
+            system_content = "You are a provocative script writer who creates engaging, debate-sparking news content that presents multiple perspectives in an emotionally charged manner while maintaining factual accuracy."
+        
+        return {
+            "model": "gpt-4o",  # hoặc model khác phù hợp
+            "messages": [
+                {"role": "system", "content": system_content},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.8 if style == "controversial" else 0.7,  # Tăng nhiệt độ cho phong cách gây tranh cãi
+            "max_tokens": 10000,
+            "stream": True  # Nhận dần từng đoạn thay vì chờ toàn bộ phản hồi
+        }
+    
+    def _call_openai_api(self, payload):
+        """Gọi OpenAI API để tạo kịch bản
+        
+        Args:
+            payload (dict): Payload tạo bởi _build_payload
             
-            payload = {
-                "model": "gpt-4o",  # hoặc model khác phù hợp
-                "messages": [
-                    {"role": "system", "content": system_content},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.8 if style == "controversial" else 0.7,  # Tăng nhiệt độ cho phong cách gây tranh cãi
-                "max_tokens": 10000
-            }
+        Returns:
+            tuple: (nội dung, complete) - nội dung là None nếu có lỗi; complete là False nếu
+                stream kết thúc mà không có [DONE] hoặc bị cắt do max_tokens
+        """
+        try:
+            url = f"{self.base_url}/chat/completions"
             
-            response = requests.post(url, headers=self.headers, json=payload)
+            body = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode('utf-8')
+            response = self._session.post(url, data=body, stream=True)
             
-            if response.status_code == 200:
-                data = response.json()
-                return data['choices'][0]['message']['content'].strip()
-            else:
-                logger.error(f"Lỗi API OpenAI: {response.status_code}, {response.text}")
-                return None
+            try:
+                if response.status_code == 200:
+                    stream_state = {}
+                    content = "".join(self._iter_stream_content(response, stream_state))
+                    complete = stream_state.get('done', False) and stream_state.get('finish_reason') != "length"
+                    return content.strip() or None, complete
+                else:
+                    logger.error(f"Lỗi API OpenAI: {response.status_code}, {response.text}")
+                    return None, False
+            finally:
+                response.close()
                 
         except Exception as e:
             logger.error(f"Lỗi khi gọi OpenAI API: {str(e)}")
-            return None
+            return None, False
+    
+    def _iter_stream_content(self, response, stream_state=None):
+        """Đọc phản hồi dạng server-sent events và trả về dần từng đoạn nội dung
+        
+        Args:
+            response: Response của requests được gọi với stream=True
+            stream_state (dict, optional): Được ghi 'done' = True khi gặp [DONE] và
+                'finish_reason' của lựa chọn đầu tiên
+            
+        Yields:
+            str: Phần nội dung (delta.content) của từng sự kiện
+        """
+        if stream_state is None:
+            stream_state = {}
+        for line in response.iter_lines():
+            # Bỏ qua dòng trống giữa các sự kiện và các dòng không phải dữ liệu
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                stream_state['done'] = True
+                break
+            try:
+                chunk = orjson.loads(data) if orjson is not None else json.loads(data)
+            except ValueError:
+                logger.warning(f"Bỏ qua sự kiện stream không hợp lệ: {data[:100]!r}")
+                continue
+            choices = chunk.get('choices') or []
+            if choices:
+                if choices[0].get('finish_reason'):
+                    stream_state['finish_reason'] = choices[0]['finish_reason']
+                piece = choices[0].get('delta', {}).get('content')
+                if piece:
+                    yield piece
     
     def _parse_scenes(self, script):
         """Phân tích kịch bản thành các phân cảnh riêng biệt
@@ -241,36 +475,32 @@ class ScriptGenerator:
         Returns:
             list: Danh sách các phân cảnh, mỗi phân cảnh là một dict
         """
-        scenes = []
-        current_scene = ""
-        scene_number = 0
-        
-        lines = script.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith('#SCENE'):
-                # Lưu phân cảnh trước đó (nếu có)
-                if current_scene and scene_number > 0:
-                    scenes.append({
-                        "number": scene_number,
-                        "content": current_scene.strip()
-                    })
-                # Bắt đầu phân cảnh mới
-                try:
-                    scene_number = int(line.replace('#SCENE', '').replace('#', '').strip())
-                    current_scene = ""
-                except ValueError:
-                    logger.warning(f"Không thể phân tích số phân cảnh từ: {line}")
-                    continue
-            elif line and scene_number > 0:
-                current_scene += line + "\n"
+        # Nội dung của mỗi phân cảnh là phần văn bản giữa dòng đánh dấu của nó và dòng kế tiếp
+        sections = []  # (số phân cảnh, các đoạn văn bản)
+        position = 0
+        for match in _SCENE_TAG_RE.finditer(script):
+            if sections:
+                sections[-1][1].append(script[position:match.start()])
+            position = match.end()
+            try:
+                scene_number = int(match.group(1).replace('#', '').strip())
+            except ValueError:
+                # Bỏ qua dòng đánh dấu lỗi, nội dung sau nó vẫn thuộc phân cảnh hiện tại
+                logger.warning(f"Không thể phân tích số phân cảnh từ: {match.group(0).strip()}")
+                continue
+            sections.append((scene_number, []))
+        if sections:
+            sections[-1][1].append(script[position:])
         
-        # Thêm phân cảnh cuối cùng
-        if current_scene and scene_number > 0:
-            scenes.append({
-                "number": scene_number,
-                "content": current_scene.strip()
-            })
+        scenes = []
+        for scene_number, parts in sections:
+            # Mỗi dòng được cắt khoảng trắng hai đầu và bỏ dòng trống, như khi đọc từng dòng
+            content = _LINE_BREAK_RE.sub("\n", "".join(parts).strip())
+            if content and scene_number > 0:
+                scenes.append({
+                    "number": scene_number,
+                    "content": content
+                })
         
         return scenes
 
@@ -287,11 +517,16 @@ if __name__ == "__main__":
     try:
         generator = ScriptGenerator()
         
-        # Test phong cách thông thường
-        script_normal = generator.generate_script(test_article, "informative")
-        
-        # Test phong cách gây tranh cãi
-        script_controversial = generator.generate_script(test_article, "controversial")
+        # Hai phong cách độc lập với nhau nên gọi API song song
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Test phong cách thông thường
+            future_normal = executor.submit(generator.generate_script, test_article, "informative", need_scenes=False)
+            
+            # Test phong cách gây tranh cãi
+            future_controversial = executor.submit(generator.generate_script, test_article, "controversial", need_scenes=False)
+            
+            script_normal = future_normal.result()
+            script_controversial = future_controversial.result()
         
         # Hiển thị kết quả
         if script_normal:
@@ -17,6 +17,13 @@ from config.settings import TEMP_DIR, VIDEO_SETTINGS
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def _file_size(path):
+    """Return the size of a file in bytes (0 if it does not exist), with a single stat call."""
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
 class VideoClipFinder:
     """Class to find and download short video clips from free sources like Pexels and Pixabay."""
     
@@ -360,7 +367,7 @@ class VideoClipFinder:
         output_path = os.path.join(self.video_cache_dir, cache_filename)
         
         # Check if already cached
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 10000:  # > 10KB
+        if _file_size(output_path) > 10000:  # > 10KB
             logger.info(f"Using cached video: {output_path}")
             return output_path
             
@@ -381,7 +388,7 @@ class VideoClipFinder:
                         f.write(chunk)
                         
             # Verify file was downloaded successfully
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 10000:  # > 10KB
+            if _file_size(output_path) > 10000:  # > 10KB
                 logger.info(f"Video downloaded successfully: {output_path}")
                 return output_path
             else:
@@ -479,6 +486,7 @@ class VideoClipFinder:
                 audio_codec='aac',
                 fps=24,
                 preset='medium',
+                threads=VIDEO_SETTINGS.get("ffmpeg_threads", 0),  # 0 = let ffmpeg use all cores
                 ffmpeg_params=['-crf', '23']  # Controls quality
             )
             
@@ -512,7 +520,7 @@ class VideoClipFinder:
         # Check for various extensions
         for ext in ['.mp4', '.webm', '.mov']:
             cache_path = os.path.join(self.video_cache_dir, f"{query_hash}{ext}")
-            if os.path.exists(cache_path) and os.path.getsize(cache_path) > 10000:  # > 10KB
+            if _file_size(cache_path) > 10000:  # > 10KB
                 return cache_path
                 
         return None
\ No newline at end of file
@@ -11,11 +11,13 @@ import shutil
 import random
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from moviepy.editor import (
     VideoFileClip, ImageClip, AudioFileClip, CompositeVideoClip, 
     concatenate_videoclips, TextClip
 )
 import moviepy.video.fx.all as vfx
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
 from moviepy.audio.AudioClip import CompositeAudioClip
 
 # Import cấu hình từ project
@@ -57,6 +59,31 @@ class VideoEditor:
         self.enable_background_music = VIDEO_SETTINGS.get("enable_background_music", False)
         self.music_volume = VIDEO_SETTINGS.get("music_volume", 0.1)
         
+        # Số luồng cho ffmpeg (0 = để ffmpeg tự dùng tất cả các nhân CPU)
+        self.ffmpeg_threads = VIDEO_SETTINGS.get("ffmpeg_threads", 0)
+        
+        # Preset x264 cho video scene trung gian; scene được giải mã và encode lại khi ghép nên preset
+        # nhanh hơn (veryfast) làm giảm chất lượng video cuối, chỉ nên đổi khi cần render nhanh
+        self.scene_preset = VIDEO_SETTINGS.get("scene_preset", "medium")
+        
+        # Số scene được render song song (mặc định 1: mỗi lần render moviepy/ffmpeg tốn nhiều bộ nhớ)
+        self.scene_render_workers = max(1, VIDEO_SETTINGS.get("scene_render_workers", 1))
+        
+        # Khi render song song, chia các nhân CPU cho các scene để các tiến trình ffmpeg không tranh nhau
+        # (mỗi tiến trình dùng tất cả các nhân sẽ làm CPU quá tải)
+        if self.scene_render_workers > 1:
+            self.scene_ffmpeg_threads = max(1, (os.cpu_count() or 1) // self.scene_render_workers)
+            if self.ffmpeg_threads > 0:
+                self.scene_ffmpeg_threads = min(self.scene_ffmpeg_threads, self.ffmpeg_threads)
+        else:
+            self.scene_ffmpeg_threads = self.ffmpeg_threads
+        
+        # Bitrate AAC khi xuất video (scene trung gian và video cuối)
+        self.audio_bitrate = VIDEO_SETTINGS.get("audio_bitrate", "192k")
+        
+        # Thời lượng của video cuối cùng vừa xuất (tránh mở lại file bằng ffmpeg chỉ để đọc thời lượng)
+        self.last_output_duration = None
+        
         logger.info(f"VideoEditor đã khởi tạo. Kích thước video: {self.width}x{self.height}, FPS: {self.fps}")
     
     def create_video(self, script, media_items, audio_dir, output_path):
@@ -99,7 +126,8 @@ class VideoEditor:
         num_videos = sum(1 for item in ordered_items if item.get('type') == 'video')
         logger.info(f"Tổng cộng {len(ordered_items)} media items ({num_images} ảnh, {num_videos} video)")
         
-        # Xử lý từng item theo thứ tự
+        # Chuẩn bị các scene cần render theo thứ tự
+        scene_jobs = []
         for i, item in enumerate(ordered_items):
             media_type = item.get('media_type', '')  # 'intro', 'scene', 'outro', etc.
             media_format = item.get('type', 'image')   # 'image' hoặc 'video'
@@ -125,15 +153,25 @@ class VideoEditor:
                 logger.warning(f"Không tìm thấy file audio: {audio_file}. Bỏ qua item này.")
                 continue
                 
-            # Xử lý media item và kết hợp với audio
-            try:
-                logger.info(f"Đang xử lý {media_type} {scene_number} ({media_format})")
-                scene_video = self.process_scene_media(item, audio_file, output_video)
-                scene_videos.append(scene_video)
-                logger.info(f"Đã xử lý xong {media_type} {scene_number}")
-            except Exception as e:
-                logger.error(f"Lỗi khi xử lý {media_type} {scene_number}: {str(e)}", exc_info=True)
-                # Tiếp tục với item tiếp theo
+            scene_jobs.append((item, audio_file, output_video, media_type, media_format, scene_number))
+        
+        # Render các scene song song (mỗi scene là một tiến trình ffmpeg độc lập), giữ đúng thứ tự khi ghép
+        with ThreadPoolExecutor(max_workers=self.scene_render_workers) as executor:
+            futures = []
+            for item, audio_file, output_video, media_type, media_format, scene_number in scene_jobs:
+                future = executor.submit(self._render_scene, item, audio_file, output_video,
+                                         media_type, media_format, scene_number)
+                futures.append((future, media_type, scene_number))
+            
+            for future, media_type, scene_number in futures:
+                # Xử lý media item và kết hợp với audio
+                try:
+                    scene_video = future.result()
+                    scene_videos.append(scene_video)
+                    logger.info(f"Đã xử lý xong {media_type} {scene_number}")
+                except Exception as e:
+                    logger.error(f"Lỗi khi xử lý {media_type} {scene_number}: {str(e)}", exc_info=logger.isEnabledFor(logging.DEBUG))
+                    # Tiếp tục với item tiếp theo
         
         # Kiểm tra xem có video scene nào được tạo không
         if not scene_videos:
@@ -145,7 +183,7 @@ class VideoEditor:
             final_video = self.concatenate_scene_videos(scene_videos, output_path)
             logger.info(f"Đã tạo video hoàn thành: {output_path}")
         except Exception as e:
-            logger.error(f"Lỗi khi nối các scene videos: {str(e)}", exc_info=True)
+            logger.error(f"Lỗi khi nối các scene videos: {str(e)}", exc_info=logger.isEnabledFor(logging.DEBUG))
             raise
         
         # Ghi metadata về video (tùy chọn)
@@ -155,7 +193,7 @@ class VideoEditor:
                 'source': script.get('source', 'Unknown'),
                 'creation_time': time.strftime('%Y-%m-%d %H:%M:%S'),
                 'dimensions': f"{self.width}x{self.height}",
-                'duration': self._get_video_duration(output_path),
+                'duration': self.last_output_duration or self._get_video_duration(output_path),
                 'num_scenes': len(scene_items),
                 'has_intro': len(intro_items) > 0,
                 'has_outro': len(outro_items) > 0,
@@ -185,7 +223,12 @@ class VideoEditor:
         
         return output_path
     
-    def process_scene_media(self, media_item, audio_path, output_path):
+    def _render_scene(self, item, audio_file, output_video, media_type, media_format, scene_number):
+        """Render một scene trong luồng của pool (log khi scene thực sự bắt đầu được xử lý)."""
+        logger.info(f"Đang xử lý {media_type} {scene_number} ({media_format})")
+        return self.process_scene_media(item, audio_file, output_video, threads=self.scene_ffmpeg_threads)
+    
+    def process_scene_media(self, media_item, audio_path, output_path, threads=None):
         """
         Xử lý media (ảnh hoặc video) cho một scene và kết hợp với audio.
         
@@ -193,6 +236,7 @@ class VideoEditor:
             media_item (dict): Thông tin media (type, path, etc.)
             audio_path (str): Đường dẫn đến file audio
             output_path (str): Đường dẫn lưu video đầu ra
+            threads (int, optional): Số luồng ffmpeg khi encode; mặc định là ffmpeg_threads
             
         Returns:
             str: Đường dẫn đến file video đã tạo
@@ -247,7 +291,7 @@ class VideoEditor:
                     final_clip = final_clip.fx(vfx.colorx, 1.1)  # Tăng cường màu sắc nhẹ
                 
             except Exception as e:
-                logger.error(f"Lỗi khi xử lý video: {str(e)}", exc_info=True)
+                logger.error(f"Lỗi khi xử lý video: {str(e)}", exc_info=logger.isEnabledFor(logging.DEBUG))
                 # Fallback: Nếu xử lý video thất bại, chuyển sang xử lý như ảnh tĩnh
                 logger.info("Chuyển sang xử lý như ảnh tĩnh do lỗi video")
                 media_type = 'image'
@@ -296,7 +340,7 @@ class VideoEditor:
                 final_clip = image_clip.set_audio(audio_clip)
                 
             except Exception as e:
-                logger.error(f"Lỗi khi xử lý ảnh: {str(e)}", exc_info=True)
+                logger.error(f"Lỗi khi xử lý ảnh: {str(e)}", exc_info=logger.isEnabledFor(logging.DEBUG))
                 raise
         
         # Xuất video scene
@@ -305,13 +349,14 @@ class VideoEditor:
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
+                audio_bitrate=self.audio_bitrate,
                 fps=self.fps,
-                preset='medium',
-                threads=4
+                preset=self.scene_preset,
+                threads=self.ffmpeg_threads if threads is None else threads
             )
             logger.info(f"Đã tạo video scene thành công: {output_path}")
         except Exception as e:
-            logger.error(f"Lỗi khi xuất video scene: {str(e)}", exc_info=True)
+            logger.error(f"Lỗi khi xuất video scene: {str(e)}", exc_info=logger.isEnabledFor(logging.DEBUG))
             raise
         
         # Đóng các clips để giải phóng bộ nhớ
@@ -340,6 +385,7 @@ class VideoEditor:
             raise ValueError("Không có scene videos để nối")
         
         logger.info(f"Nối {len(scene_videos)} video scenes thành video cuối cùng")
+        self.last_output_duration = None
         
         # Đọc tất cả clip
         video_clips = []
@@ -472,13 +518,15 @@ class VideoEditor:
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
+                audio_bitrate=self.audio_bitrate,
                 fps=self.fps,
                 preset='medium',
-                threads=4
+                threads=self.ffmpeg_threads
             )
             logger.info(f"Đã xuất video cuối cùng thành công: {output_path}")
+            self.last_output_duration = final_video.duration
         except Exception as e:
-            logger.error(f"Lỗi khi xuất video cuối cùng: {str(e)}", exc_info=True)
+            logger.error(f"Lỗi khi xuất video cuối cùng: {str(e)}", exc_info=logger.isEnabledFor(logging.DEBUG))
             raise
         
         # Đóng tất cả clips để giải phóng tài nguyên
@@ -551,6 +599,7 @@ class VideoEditor:
             output_path,
             codec='libx264',
             audio_codec='aac',
+            audio_bitrate=self.audio_bitrate,
             fps=self.fps
         )
         
@@ -634,10 +683,8 @@ class VideoEditor:
     def _get_video_duration(self, video_path):
         """Lấy thời lượng của video."""
         try:
-            clip = VideoFileClip(video_path)
-            duration = clip.duration
-            clip.close()
-            return duration
+            # Chỉ đọc header bằng ffmpeg, không mở reader/audio và giải mã frame như VideoFileClip
+            return ffmpeg_parse_infos(video_path)['duration']
         except Exception as e:
             logger.warning(f"Không xác định được thời lượng video: {str(e)}")
             return 0
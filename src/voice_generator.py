@@ -1,12 +1,34 @@
 # src/voice_generator.py
 import os
+import re
 import sys
 import logging
 import time
 import json
+import random
+import hashlib
+import shutil
+import tempfile
+import threading
+import unicodedata
+import operator
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from mutagen import File as MutagenFile
+    _HAS_MUTAGEN = True
+except ImportError:
+    _HAS_MUTAGEN = False
+
 # Thêm thư mục gốc vào sys.path
 if __name__ == "__main__":
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -14,7 +36,7 @@ if __name__ == "__main__":
         sys.path.insert(0, project_root)
 
 from config.credentials import OPENAI_API_KEY
-from config.settings import TEMP_DIR
+from config.settings import TEMP_DIR, VOICE_SETTINGS
 
 # Tải các biến môi trường
 load_dotenv()
@@ -22,9 +44,101 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Tag đánh dấu phân cảnh trong full_script, biên dịch một lần cho cả module
+_SCENE_TAG_RE = re.compile(r"#SCENE\s+\d+#")
+# Khoảng trắng liên tiếp (kể cả xuống dòng) được gộp thành một dấu cách trước khi tổng hợp
+_WS_RE = re.compile(r"\s+")
+# Dấu nháy kiểu chữ được đổi về dạng ASCII để văn bản tương đương dùng chung cache
+_QUOTE_TABLE = str.maketrans({"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"'})
+# Ranh giới câu dùng khi phải tách văn bản dài thành nhiều request
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+
+# Thời lượng đã đọc, khóa theo (thiết bị, inode, mtime, kích thước); các file hardlink từ cùng một
+# file cache dùng chung inode nên chỉ phải đọc header một lần
+_DURATION_CACHE = {}
+
+# Bảng tra header MPEG Layer III: bitrate (kbps) theo chỉ số, tần số lấy mẫu (Hz) theo phiên bản
+_MP3_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_MP3_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def _fast_mp3_duration(path, file_size):
+    """Tính thời lượng MP3 CBR từ header frame đầu tiên và kích thước file
+    
+    Trả về None nếu không phải MP3 Layer III hoặc là file VBR (có header Xing), khi đó
+    cần đọc bằng mutagen.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(10)
+        tag_size = 0
+        if head[:3] == b"ID3" and len(head) == 10:
+            # Kích thước tag ID3v2 là số nguyên "syncsafe" 4 byte (mỗi byte 7 bit)
+            tag_size = 10 + ((head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F))
+        f.seek(tag_size)
+        frame = f.read(64)
+    
+    if len(frame) < 4 or frame[0] != 0xFF or (frame[1] & 0xE0) != 0xE0:
+        return None
+    version = (frame[1] >> 3) & 0x03
+    layer = (frame[1] >> 1) & 0x03
+    bitrate_index = frame[2] >> 4
+    sample_rate_index = (frame[2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    
+    # Vị trí header Xing/Info phụ thuộc vào phiên bản MPEG và số kênh
+    mono = (frame[3] >> 6) == 3
+    if version == 3:
+        xing_offset = 4 + (17 if mono else 32)
+    else:
+        xing_offset = 4 + (9 if mono else 17)
+    if frame[xing_offset:xing_offset + 4] == b"Xing":
+        return None
+    
+    bitrates = _MP3_BITRATES_V1 if version == 3 else _MP3_BITRATES_V2
+    return (file_size - tag_size) * 8 / (bitrates[bitrate_index] * 1000)
+
+# OpenAI TTS giới hạn 4096 ký tự cho mỗi request
+MAX_TTS_CHARS = 4000
+# Kích thước bộ đệm khi ghi file âm thanh, gom các phần nhỏ thành ít lần ghi xuống đĩa
+WRITE_BUFFER_SIZE = 1 << 20
+# Mặc định: kịch bản đầy đủ dài hơn ngưỡng này được tách thành các đoạn nhỏ và tổng hợp song song
+PARALLEL_SPLIT_THRESHOLD = 800
+PARALLEL_CHUNK_CHARS = 500
+
+class _TokenBucket:
+    """Giới hạn tốc độ gửi request: tối đa `rate` request/giây, cho phép dồn tối đa `burst` request"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Chờ đến khi có token rồi lấy một token"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 class VoiceGenerator:
-    def __init__(self):
-        """Khởi tạo VoiceGenerator sử dụng OpenAI TTS API"""
+    def __init__(self, model=None, voice=None, verify_connection=True):
+        """Khởi tạo VoiceGenerator sử dụng OpenAI TTS API
+        
+        Args:
+            model: Model TTS ("tts-1" nhanh, "tts-1-hd" chất lượng cao). Mặc định lấy từ
+                biến môi trường OPENAI_TTS_MODEL hoặc "tts-1"
+            voice: Giọng đọc. Mặc định lấy từ biến môi trường OPENAI_TTS_VOICE hoặc "alloy"
+            verify_connection: Kiểm tra kết nối API khi khởi tạo. Tắt khi chạy hàng loạt
+        """
         self.temp_dir = TEMP_DIR
         self.api_key = OPENAI_API_KEY
         
@@ -39,78 +153,169 @@ class VoiceGenerator:
             "Content-Type": "application/json"
         }
         
+        # Số request TTS chạy song song khi tạo âm thanh cho các phân cảnh
+        self.max_concurrent_requests = VOICE_SETTINGS.get("max_concurrent_requests", 3)
+        
+        # Dùng chung một session để tái sử dụng kết nối TCP/TLS giữa các request
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        # Adapter chỉ thử lại lỗi kết nối; lỗi 429/5xx (kể cả có Retry-After) được trả về nguyên vẹn
+        # để _post_with_backoff là nơi duy nhất thử lại theo mã trạng thái, qua bộ giới hạn tốc độ
+        retry = Retry(
+            total=3,
+            status=0,
+            backoff_factor=0.3,
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=False
+        )
+        # Chỉ gọi một host nên một pool là đủ; kích thước pool bằng số request đồng thời
+        # để mỗi luồng giữ được kết nối keep-alive riêng, không phải mở lại kết nối
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrent_requests, max_retries=retry)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        
         # Tạo thư mục lưu trữ âm thanh
         self.audio_dir = os.path.join(self.temp_dir, "audio")
         os.makedirs(self.audio_dir, exist_ok=True)
         
+        # Cache âm thanh trên đĩa, khóa theo (giọng, model, văn bản), dọn theo LRU khi vượt dung lượng
+        self.cache_dir = os.path.join(self.temp_dir, "tts_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_index_path = os.path.join(self.cache_dir, "index.json")
+        self.cache_max_bytes = VOICE_SETTINGS.get("tts_cache_max_mb", 500) * 1024 * 1024
+        self.cache_ttl = VOICE_SETTINGS.get("tts_cache_ttl_days", 30) * 86400
+        self.cache_index = self._load_cache_index()
+        # Dùng lại hay thêm file cache chỉ đánh dấu chỉ mục đã đổi, ghi ra đĩa một lần ở cuối mỗi kịch bản
+        self._cache_index_dirty = False
+        self._cache_lock = threading.Lock()
+        self._sweep_expired_cache()
+        
+        # Tách kịch bản dài thành các đoạn để tổng hợp song song (ngưỡng không vượt giới hạn API,
+        # nếu không văn bản dài hơn giới hạn sẽ bị gửi nguyên trong một request)
+        self.split_threshold = min(VOICE_SETTINGS.get("tts_split_threshold", PARALLEL_SPLIT_THRESHOLD), MAX_TTS_CHARS)
+        self.chunk_chars = min(VOICE_SETTINGS.get("tts_chunk_chars", PARALLEL_CHUNK_CHARS), MAX_TTS_CHARS)
+        
+        # Giới hạn tốc độ gửi request để dùng hết hạn mức API mà không bị trả về 429
+        self._rate_limiter = _TokenBucket(
+            VOICE_SETTINGS.get("requests_per_second", 2),
+            VOICE_SETTINGS.get("request_burst", 8)
+        )
+        
+        # Ngắt mạch: sau nhiều lỗi liên tiếp thì tạm ngừng gọi API để các phân cảnh sau thất bại ngay
+        self._fail_count = 0
+        self._circuit_open_until = 0
+        self._circuit_lock = threading.Lock()
+        
         # Thiết lập mặc định cho OpenAI TTS
-        self.voice = "alloy"  # Các lựa chọn: alloy, echo, fable, onyx, nova, shimmer
-        self.model = "tts-1"  # hoặc "tts-1-hd" cho chất lượng cao hơn
+        self.voice = voice or os.getenv("OPENAI_TTS_VOICE", "alloy")  # Các lựa chọn: alloy, echo, fable, onyx, nova, shimmer
+        self.model = model or os.getenv("OPENAI_TTS_MODEL", "tts-1")  # hoặc "tts-1-hd" cho chất lượng cao hơn
+        # Luôn là MP3: tên file, việc đọc thời lượng và việc nối các đoạn đều dựa trên frame MP3
+        self.response_format = "mp3"
+        self._update_payload_template()
         
         # Kiểm tra kết nối
-        self._test_connection()
+        if verify_connection:
+            self._test_connection()
+    
+    def close(self):
+        """Ghi chỉ mục cache còn chờ, đóng session HTTP và giải phóng các kết nối đang giữ"""
+        if getattr(self, "_cache_index_dirty", False):
+            self._flush_cache_index()
+        session = getattr(self, "_session", None)
+        if session is not None:
+            session.close()
+            self._session = None
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
     
     def _test_connection(self):
-        """Kiểm tra kết nối với OpenAI API"""
+        """Kiểm tra kết nối với OpenAI API
+        
+        Kết quả thành công được lưu lại trong 24 giờ (theo model và API key) để không phải gọi API
+        mỗi lần khởi tạo; đổi key hoặc model thì kiểm tra lại.
+        """
+        check_path = os.path.join(self.cache_dir, "connection_check.json")
+        # Chỉ lưu hash của API key, không lưu bản thân key
+        key_hash = hashlib.blake2b(self.api_key.encode('utf-8'), digest_size=16).hexdigest()
         try:
-            # Tạo một đoạn audio ngắn để kiểm tra kết nối
-            test_text = "OpenAI TTS connection test."
-            
-            payload = {
-                "model": self.model,
-                "input": test_text,
-                "voice": self.voice
-            }
-            
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
+            with open(check_path, 'r', encoding='utf-8') as f:
+                last_check = json.load(f)
+            if (last_check.get("model") == self.model and last_check.get("key") == key_hash
+                    and time.time() - last_check.get("time", 0) < 86400):
+                logger.info("Đang sử dụng model: %s với giọng: %s (đã kiểm tra kết nối gần đây)", self.model, self.voice)
+                return
+        except (OSError, ValueError):
+            pass
+        
+        try:
+            # Tra cứu thông tin model (miễn phí), không tổng hợp âm thanh thử để tránh tốn phí
+            response = self._session.get(
+                f"https://api.openai.com/v1/models/{self.model}",
+                timeout=30
             )
             
             if response.status_code == 200:
                 logger.info("Kết nối OpenAI TTS API thành công.")
-                logger.info(f"Đang sử dụng model: {self.model} với giọng: {self.voice}")
+                logger.info("Đang sử dụng model: %s với giọng: %s", self.model, self.voice)
+                try:
+                    self._atomic_write(check_path, json.dumps({"model": self.model, "key": key_hash, "time": time.time()}).encode('utf-8'))
+                except OSError:
+                    pass
             else:
-                logger.warning(f"Không thể kết nối đến OpenAI TTS API: {response.status_code}, {response.text}")
+                logger.warning("Không thể kết nối đến OpenAI TTS API: %s, %s", response.status_code, response.text)
                 
         except Exception as e:
-            logger.error(f"Lỗi khi kết nối đến OpenAI TTS API: {str(e)}")
+            logger.error("Lỗi khi kết nối đến OpenAI TTS API: %s", e)
     
     def generate_audio_for_script(self, script):
         """Tạo file âm thanh cho kịch bản"""
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        project_dir = os.path.join(self.audio_dir, f"project_{timestamp}")
-        os.makedirs(project_dir, exist_ok=True)
+        started_at = time.localtime()
+        timestamp = time.strftime("%Y%m%d_%H%M%S", started_at)
+        creation_time = time.strftime("%Y-%m-%d %H:%M:%S", started_at)
+        project_name = f"project_{timestamp}"
+        project_dir = os.path.join(self.audio_dir, project_name)
+        # audio_dir đã được tạo trong __init__ nên chỉ cần tạo một cấp thư mục
+        try:
+            os.mkdir(project_dir)
+        except FileExistsError:
+            pass
         
-        logger.info(f"Bắt đầu tạo giọng nói cho kịch bản: {script['title']}")
+        logger.info("Bắt đầu tạo giọng nói cho kịch bản: %s", script['title'])
         
         audio_files = []
+        # Sắp xếp phân cảnh theo số thứ tự một lần, dùng chung cho nội dung đầy đủ và vòng tạo âm thanh
+        scenes = self._ordered_by_number(script.get('scenes') or [])
         
-        # Tạo file âm thanh cho toàn bộ kịch bản
-        try:
-            full_script_content = self._extract_full_script_content(script)
-            
-            full_audio_path = os.path.join(project_dir, "full_audio.mp3")
-            self._generate_audio(full_script_content, full_audio_path)
-            
-            # Ghi âm thành công, thêm thông tin vào danh sách
-            duration = self._estimate_duration(full_script_content)
-            
-            audio_files.append({
-                "type": "full",
-                "path": full_audio_path,
-                "duration": duration,
-                "content": full_script_content
-            })
+        # Kịch bản đầy đủ và các phân cảnh dùng chung một pool, giới hạn số request đồng thời
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            # Gửi các đoạn của kịch bản đầy đủ vào pool (kịch bản dài được tách nhỏ để tổng hợp song song)
+            full_job = None
+            # Không có full_script thì âm thanh đầy đủ chính là các phân cảnh nối lại, không cần gọi API riêng
+            full_from_scenes = not script.get('full_script') and bool(scenes)
+            try:
+                full_script_content = self._extract_full_script_content(script, scenes)
+                full_audio_path = os.path.join(project_dir, "full_audio.mp3")
+                
+                if not full_from_scenes:
+                    if len(full_script_content) > self.split_threshold:
+                        chunks = self._split_text(full_script_content, self.chunk_chars)
+                        logger.info("Tổng hợp song song %s đoạn cho: %s", len(chunks), full_audio_path)
+                    else:
+                        chunks = [full_script_content]
+                    
+                    chunk_futures = [executor.submit(self._synthesize, chunk) for chunk in chunks]
+                    full_job = (chunk_futures, full_script_content, full_audio_path)
+            except Exception as e:
+                logger.error("Lỗi khi tạo file âm thanh đầy đủ: %s", e)
             
-            logger.info(f"Đã tạo file âm thanh đầy đủ: {full_audio_path}")
-        except Exception as e:
-            logger.error(f"Lỗi khi tạo file âm thanh đầy đủ: {str(e)}")
-        
-        # Tạo file âm thanh cho từng phân cảnh
-        if script.get('scenes'):
-            for scene in script['scenes']:
+            # Gửi các phân cảnh vào pool, các phân cảnh trùng nội dung chỉ tổng hợp một lần
+            scene_jobs = []
+            seen_texts = {}
+            for scene in scenes:
                 try:
                     scene_number = scene['number']
                     content = scene['content']
@@ -119,11 +324,51 @@ class VoiceGenerator:
                     scene_audio_filename = f"scene_{scene_number}.mp3"
                     scene_audio_path = os.path.join(project_dir, scene_audio_filename)
                     
-                    # Tạo file âm thanh
-                    self._generate_audio(content, scene_audio_path)
+                    # Tạo file âm thanh (hoặc dùng lại kết quả của phân cảnh trước có cùng nội dung)
+                    text_key = self._normalize(content)
+                    if text_key in seen_texts:
+                        future, source_path = seen_texts[text_key]
+                    else:
+                        future = executor.submit(self._generate_audio_with_duration, content, scene_audio_path)
+                        source_path = None
+                        seen_texts[text_key] = (future, scene_audio_path)
+                    scene_jobs.append((future, scene_number, content, scene_audio_path, source_path))
+                except Exception as e:
+                    logger.error("Lỗi khi tạo file âm thanh cho phân cảnh %s: %s", scene.get('number', 'unknown'), e)
+            
+            # Ghép file âm thanh đầy đủ khi các đoạn đã xong
+            if full_job is not None:
+                chunk_futures, full_script_content, full_audio_path = full_job
+                try:
+                    chunk_paths = [future.result() for future in chunk_futures]
+                    if len(chunk_paths) == 1:
+                        self._link_or_copy(chunk_paths[0], full_audio_path)
+                    else:
+                        self._concat_audio_files(chunk_paths, full_audio_path)
+                    
+                    # Ghi âm thành công, thêm thông tin vào danh sách
+                    duration = self._get_audio_duration(full_audio_path, full_script_content)
+                    
+                    audio_files.append({
+                        "type": "full",
+                        "path": full_audio_path,
+                        "duration": duration,
+                        "content": full_script_content
+                    })
+                    
+                    logger.info("Đã tạo file âm thanh đầy đủ: %s", full_audio_path)
+                except Exception as e:
+                    logger.error("Lỗi khi tạo file âm thanh đầy đủ: %s", e)
+            
+            # Thu kết quả theo đúng thứ tự phân cảnh trong kịch bản
+            for future, scene_number, content, scene_audio_path, source_path in scene_jobs:
+                try:
+                    # Thời lượng đã được đọc trong luồng tổng hợp
+                    duration = future.result()
+                    if source_path is not None:
+                        self._link_or_copy(source_path, scene_audio_path)
                     
                     # Ghi âm thành công, thêm thông tin vào danh sách
-                    duration = self._estimate_duration(content)
                     
                     audio_files.append({
                         "type": "scene",
@@ -133,116 +378,436 @@ class VoiceGenerator:
                         "content": content
                     })
                     
-                    logger.info(f"Đã tạo file âm thanh cho phân cảnh {scene_number}")
+                    logger.info("Đã tạo file âm thanh cho phân cảnh %s", scene_number)
                 except Exception as e:
-                    logger.error(f"Lỗi khi tạo file âm thanh cho phân cảnh {scene.get('number', 'unknown')}: {str(e)}")
+                    logger.error("Lỗi khi tạo file âm thanh cho phân cảnh %s: %s", scene_number, e)
+        
+        # Ghép âm thanh đầy đủ từ các phân cảnh theo thứ tự số phân cảnh
+        if full_from_scenes and audio_files:
+            try:
+                if len(audio_files) == len(scene_jobs):
+                    scene_paths = [audio['path'] for audio in audio_files]
+                    self._concat_audio_files(scene_paths, full_audio_path)
+                    logger.info("Đã ghép file âm thanh đầy đủ từ %s phân cảnh", len(scene_paths))
+                else:
+                    # Thiếu phân cảnh nên không ghép được, tổng hợp toàn bộ văn bản như bình thường
+                    self._generate_audio(full_script_content, full_audio_path)
+                
+                audio_files.insert(0, {
+                    "type": "full",
+                    "path": full_audio_path,
+                    "duration": self._get_audio_duration(full_audio_path, full_script_content),
+                    "content": full_script_content
+                })
+                
+                logger.info("Đã tạo file âm thanh đầy đủ: %s", full_audio_path)
+            except Exception as e:
+                logger.error("Lỗi khi tạo file âm thanh đầy đủ: %s", e)
+        
+        # Thời điểm dùng gần nhất của các file cache được ghi một lần cho cả kịch bản
+        self._flush_cache_index()
         
         # Lưu thông tin các file âm thanh
-        self._save_audio_info(audio_files, script['title'], project_dir)
+        self._save_audio_info(audio_files, script['title'], project_dir, project_name, creation_time)
         
-        logger.info(f"Đã tạo {len(audio_files)} file âm thanh cho kịch bản")
+        logger.info("Đã tạo %s file âm thanh cho kịch bản", len(audio_files))
         
         return audio_files
     
     def _generate_audio(self, text, output_path):
-        """Tạo file âm thanh từ văn bản sử dụng OpenAI TTS API"""
+        """Tạo file âm thanh từ văn bản sử dụng OpenAI TTS API
+        
+        Văn bản dài hơn giới hạn của API được tách theo câu, tổng hợp từng đoạn rồi nối lại.
+        """
         try:
-            # Kiểm tra xem văn bản có quá dài không
-            # OpenAI TTS có giới hạn khoảng 4096 tokens (khoảng 3000 từ)
-            if len(text) > 4000:
-                logger.warning(f"Văn bản quá dài ({len(text)} ký tự), có thể gây lỗi API. Cắt xuống 4000 ký tự.")
-                text = text[:4000]
+            if len(text) <= MAX_TTS_CHARS:
+                cache_path = self._synthesize(text)
+                self._link_or_copy(cache_path, output_path)
+            else:
+                chunks = self._split_text(text)
+                logger.info("Văn bản dài (%s ký tự), tách thành %s đoạn để tổng hợp", len(text), len(chunks))
+                chunk_paths = [self._synthesize(chunk) for chunk in chunks]
+                self._concat_audio_files(chunk_paths, output_path)
             
-            # Payload theo định dạng của API OpenAI
-            payload = {
-                "model": self.model,
-                "input": text,
-                "voice": self.voice,
-                "response_format": "mp3"
-            }
+            logger.info("Đã tạo file âm thanh tại: %s", output_path)
+            return output_path
+                
+        except Exception as e:
+            logger.error("Lỗi khi tạo âm thanh với OpenAI TTS: %s", e)
+            raise
+    
+    def _generate_audio_with_duration(self, text, output_path):
+        """Tạo file âm thanh và đọc luôn thời lượng trong cùng luồng làm việc"""
+        self._generate_audio(text, output_path)
+        return self._get_audio_duration(output_path, text)
+    
+    def _synthesize(self, text):
+        """Tổng hợp một đoạn văn bản (không vượt quá giới hạn API) và trả về đường dẫn file trong cache"""
+        # Chuẩn hóa trước khi băm và gửi API để các văn bản chỉ khác khoảng trắng/dấu nháy dùng chung cache
+        text = self._normalize(text)
+        
+        # Dùng lại file đã tổng hợp trước đó nếu có trong cache
+        cache_key = self._cache_key(text)
+        cache_path = os.path.join(self.cache_dir, f"{cache_key}.mp3")
+        if os.path.exists(cache_path):
+            self._touch_cache_entry(cache_key, cache_path)
+            logger.info("Dùng âm thanh từ cache: %s", cache_key)
+            return cache_path
+        
+        if time.time() < self._circuit_open_until:
+            raise Exception("OpenAI TTS đang tạm ngừng do lỗi liên tiếp, bỏ qua request")
+        
+        # Payload theo định dạng của API OpenAI
+        # Tạo bản mới từ mẫu dựng sẵn (không sửa mẫu dùng chung vì nhiều luồng gọi đồng thời)
+        payload = {**self._payload_template, "input": text}
+        body = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode('utf-8')
+        
+        # Gọi API ở chế độ stream để ghi từng phần dữ liệu xuống đĩa ngay khi nhận được
+        try:
+            with self._post_with_backoff(body) as response:
+                # Kiểm tra kết quả
+                if response.status_code != 200:
+                    error_msg = f"Lỗi API ({response.status_code}): {response.text}"
+                    logger.error(error_msg)
+                    raise Exception(error_msg)
+                
+                # Ghi vào file tạm rồi đổi tên để cache không bao giờ chứa file dở dang
+                fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+                try:
+                    audio_size = 0
+                    with os.fdopen(fd, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+                        for chunk in response.iter_content(chunk_size=64 * 1024):
+                            f.write(chunk)
+                            audio_size += len(chunk)
+                    os.replace(tmp_path, cache_path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+        except Exception:
+            self._record_failure()
+            raise
+        
+        self._fail_count = 0
+        self._add_cache_entry(cache_key, audio_size)
+        return cache_path
+    
+    def _record_failure(self):
+        """Đếm lỗi liên tiếp, mở mạch trong 60 giây khi đạt 3 lỗi"""
+        with self._circuit_lock:
+            self._fail_count += 1
+            if self._fail_count >= 3:
+                self._circuit_open_until = time.time() + 60
+                self._fail_count = 0
+                logger.warning("OpenAI TTS lỗi liên tiếp, tạm ngừng gọi API trong 60 giây")
+    
+    def _post_with_backoff(self, body, max_retries=5):
+        """Gửi request TTS, thử lại khi bị giới hạn tốc độ (429) hoặc máy chủ lỗi (5xx)
+        
+        Với 429 chờ theo header Retry-After, với 5xx chờ theo cấp số nhân có thêm nhiễu ngẫu nhiên.
+        """
+        for attempt in range(max_retries + 1):
+            self._rate_limiter.acquire()
+            response = self._session.post(self.base_url, data=body, stream=True, timeout=60)
+            status = response.status_code
+            if attempt == max_retries or (status != 429 and status < 500):
+                return response
             
-            # Gọi API
-            response = requests.post(self.base_url, json=payload, headers=self.headers)
+            if status == 429:
+                try:
+                    delay = float(response.headers.get("retry-after"))
+                except (TypeError, ValueError):
+                    delay = min(2 ** attempt, 30)
+            else:
+                delay = min(0.3 * 2 ** attempt + random.random() * 0.1, 30)
+            response.close()
             
-            # Kiểm tra kết quả
-            if response.status_code == 200:
-                # Lưu audio vào file
-                with open(output_path, 'wb') as f:
-                    f.write(response.content)
-                
-                logger.info(f"Đã tạo file âm thanh tại: {output_path}")
-                return output_path
+            logger.warning("OpenAI TTS trả về %s, thử lại sau %.1fs (lần %s/%s)", status, delay, attempt + 1, max_retries)
+            time.sleep(delay)
+    
+    def _split_text(self, text, max_chars=MAX_TTS_CHARS):
+        """Tách văn bản thành các đoạn không quá max_chars ký tự, ưu tiên ngắt ở cuối câu"""
+        chunks = []
+        current = ""
+        for sentence in _SENTENCE_END_RE.split(text.strip()):
+            # Câu dài hơn giới hạn thì cắt tại khoảng trắng gần nhất
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(' ', 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            
+            if not current:
+                current = sentence
+            elif len(current) + 1 + len(sentence) <= max_chars:
+                current = f"{current} {sentence}"
             else:
-                error_msg = f"Lỗi API ({response.status_code}): {response.text}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
-                
-        except Exception as e:
-            logger.error(f"Lỗi khi tạo âm thanh với OpenAI TTS: {str(e)}")
+                chunks.append(current)
+                current = sentence
+        
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    @staticmethod
+    def _atomic_write(path, data):
+        """Ghi dữ liệu ra file tạm, fsync rồi đổi tên để file đích không bao giờ bị ghi dở"""
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path) or ".")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise
     
-    def _extract_full_script_content(self, script):
-        """Trích xuất nội dung đầy đủ từ kịch bản"""
+    def _concat_audio_files(self, input_paths, output_path):
+        """Nối các file âm thanh theo thứ tự (các frame MP3 độc lập nên có thể nối trực tiếp từng byte)"""
+        output_dir = os.path.dirname(output_path) or "."
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=output_dir)
+        try:
+            with os.fdopen(fd, 'wb', buffering=WRITE_BUFFER_SIZE) as out:
+                for path in input_paths:
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, out, WRITE_BUFFER_SIZE)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def _normalize(self, text):
+        """Chuẩn hóa văn bản: NFKC, bỏ tag #SCENE, thống nhất dấu nháy và gộp khoảng trắng"""
+        text = unicodedata.normalize("NFKC", text)
+        text = _SCENE_TAG_RE.sub("", text)
+        text = text.translate(_QUOTE_TABLE)
+        return _WS_RE.sub(" ", text).strip()
+    
+    def _cache_key(self, text):
+        """Tạo khóa cache từ giọng đọc, model và văn bản"""
+        return hashlib.blake2b(f"{self.voice}|{self.model}|{self.response_format}|{text}".encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _link_or_copy(self, src, dst):
+        """Tạo hard link từ cache sang file đích, copy nếu không link được (khác ổ đĩa, v.v.)"""
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+    
+    def _load_cache_index(self):
+        """Đọc chỉ mục cache (khóa -> kích thước, thời điểm tạo, thời hạn, thời điểm dùng gần nhất)"""
+        try:
+            with open(self.cache_index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_cache_index(self):
+        """Ghi chỉ mục cache ra đĩa (gọi khi đang giữ _cache_lock)"""
+        try:
+            self._atomic_write(self.cache_index_path, json.dumps(self.cache_index).encode('utf-8'))
+            self._cache_index_dirty = False
+        except OSError as e:
+            logger.warning("Không thể lưu chỉ mục cache âm thanh: %s", e)
+    
+    def _flush_cache_index(self):
+        """Ghi chỉ mục cache nếu có thay đổi chưa được lưu"""
+        with self._cache_lock:
+            if self._cache_index_dirty:
+                self._save_cache_index()
+    
+    def _touch_cache_entry(self, cache_key, cache_path):
+        """Cập nhật thời điểm dùng gần nhất của một file trong cache (chỉ trong bộ nhớ)"""
+        with self._cache_lock:
+            entry = self.cache_index.get(cache_key)
+            if entry is None:
+                entry = self.cache_index[cache_key] = {
+                    "size": os.path.getsize(cache_path),
+                    "created": time.time(),
+                    "ttl": self.cache_ttl
+                }
+            entry["atime"] = time.time()
+            self._cache_index_dirty = True
+    
+    def _add_cache_entry(self, cache_key, size):
+        """Thêm file mới vào cache và dọn bớt nếu vượt dung lượng (chỉ mục được ghi khi flush)"""
+        with self._cache_lock:
+            now = time.time()
+            self.cache_index[cache_key] = {"size": size, "created": now, "ttl": self.cache_ttl, "atime": now}
+            self._evict_cache()
+            self._cache_index_dirty = True
+    
+    def _sweep_expired_cache(self):
+        """Xóa các file cache đã quá thời hạn lưu trữ (chạy một lần khi khởi tạo)"""
+        now = time.time()
+        expired = [
+            cache_key for cache_key, entry in self.cache_index.items()
+            if now - entry.get("created", entry.get("atime", now)) > entry.get("ttl", self.cache_ttl)
+        ]
+        if not expired:
+            return
+        
+        with self._cache_lock:
+            for cache_key in expired:
+                try:
+                    os.remove(os.path.join(self.cache_dir, f"{cache_key}.mp3"))
+                except FileNotFoundError:
+                    pass
+                del self.cache_index[cache_key]
+            self._save_cache_index()
+        logger.info("Đã xóa %s file hết hạn khỏi cache âm thanh", len(expired))
+    
+    def _evict_cache(self):
+        """Xóa các file ít được dùng gần đây nhất cho đến khi cache nằm trong giới hạn"""
+        total_size = sum(entry["size"] for entry in self.cache_index.values())
+        if total_size <= self.cache_max_bytes:
+            return
+        
+        for cache_key, entry in sorted(self.cache_index.items(), key=lambda item: item[1]["atime"]):
+            if total_size <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, f"{cache_key}.mp3"))
+            except FileNotFoundError:
+                pass
+            total_size -= entry["size"]
+            del self.cache_index[cache_key]
+            logger.info("Đã xóa khỏi cache âm thanh: %s", cache_key)
+    
+    @staticmethod
+    def _ordered_by_number(items):
+        """Trả về các phần tử theo thứ tự 'number', chỉ sắp xếp khi chúng chưa đúng thứ tự"""
+        if any(items[i]['number'] > items[i + 1]['number'] for i in range(len(items) - 1)):
+            return sorted(items, key=operator.itemgetter('number'))
+        return items
+    
+    def _extract_full_script_content(self, script, scenes=None):
+        """Trích xuất nội dung đầy đủ từ kịch bản
+        
+        Args:
+            script: Kịch bản
+            scenes: Danh sách phân cảnh đã sắp xếp theo số thứ tự (nếu đã có sẵn)
+        """
         if 'full_script' in script and script['full_script']:
             # Xóa các tag #SCENE X# nếu có
-            content = script['full_script']
-            import re
-            content = re.sub(r'#SCENE \d+#', '', content)
-            return content.strip()
+            return _SCENE_TAG_RE.sub('', script['full_script']).strip()
         
         # Nếu không có full_script, ghép nội dung từ các phân cảnh
         if 'scenes' in script and script['scenes']:
-            scene_contents = [scene['content'] for scene in sorted(script['scenes'], key=lambda x: x['number'])]
-            return ' '.join(scene_contents)
+            if scenes is None:
+                scenes = self._ordered_by_number(script['scenes'])
+            return ' '.join(scene['content'] for scene in scenes)
         
         # Nếu không có cả hai, trả về tiêu đề
         return script.get('title', '')
     
+    def _get_audio_duration(self, audio_path, text):
+        """Lấy thời lượng thực của file âm thanh từ header, không cần giải mã cả file
+        
+        Nếu không đọc được (không phải MP3 CBR và thiếu mutagen, hoặc file lỗi) thì ước tính theo số từ.
+        """
+        try:
+            st = os.stat(audio_path)
+            key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+            duration = _DURATION_CACHE.get(key)
+            if duration is not None:
+                return duration
+            
+            # MP3 CBR (định dạng mặc định của OpenAI TTS) chỉ cần đọc header frame đầu tiên
+            duration = _fast_mp3_duration(audio_path, st.st_size)
+            if duration is None and _HAS_MUTAGEN:
+                audio = MutagenFile(audio_path)
+                if audio is not None:
+                    duration = audio.info.length
+            
+            if duration:
+                _DURATION_CACHE[key] = duration
+                return duration
+        except Exception as e:
+            logger.debug("Không đọc được thời lượng từ %s: %s", audio_path, e)
+        return self._estimate_duration(text)
+    
     def _estimate_duration(self, text):
         """Ước tính thời lượng của đoạn âm thanh dựa trên số từ"""
         # Tiếng Anh: trung bình 3 từ/giây khi đọc
-        words = text.split()
-        return len(words) / 3
+        # Đếm khoảng trắng thay vì split() để không phải tạo danh sách các từ
+        text = text.strip()
+        if not text:
+            return 0
+        words = text.count(' ') + text.count('\n') + 1
+        return words / 3
     
-    def _save_audio_info(self, audio_files, title, project_dir):
+    def _save_audio_info(self, audio_files, title, project_dir, project_name, creation_time):
         """Lưu thông tin âm thanh vào file JSON"""
-        # Tạo bản sao để tránh thay đổi dữ liệu gốc
-        audio_info = []
-        for audio in audio_files:
-            # Chỉ lưu đường dẫn tương đối để dễ di chuyển
-            audio_copy = audio.copy()
-            audio_copy['rel_path'] = os.path.basename(audio['path'])
-            audio_info.append(audio_copy)
+        # Chỉ lấy các trường cần lưu, thêm đường dẫn tương đối để dễ di chuyển
+        basename = os.path.basename
+        audio_info = [self._audio_entry(audio, basename(audio['path'])) for audio in audio_files]
         
         output_file = os.path.join(project_dir, "audio_info.json")
+        info = {
+            'title': title,
+            'creation_time': creation_time,
+            'project_dir': project_name,
+            'audio_files': audio_info
+        }
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                'title': title,
-                'creation_time': time.strftime("%Y-%m-%d %H:%M:%S"),
-                'project_dir': os.path.basename(project_dir),
-                'audio_files': audio_info
-            }, f, ensure_ascii=False, indent=4)
+        # Dùng orjson nếu có (nhanh hơn nhiều với văn bản không phải ASCII), nếu không dùng json chuẩn
+        if orjson is not None:
+            data = orjson.dumps(info, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        else:
+            data = json.dumps(info, ensure_ascii=False, indent=4).encode('utf-8')
+        self._atomic_write(output_file, data)
         
-        logger.info(f"Đã lưu thông tin âm thanh tại: {output_file}")
+        logger.info("Đã lưu thông tin âm thanh tại: %s", output_file)
+    
+    @staticmethod
+    def _audio_entry(audio, rel_path):
+        """Tạo bản ghi JSON cho một file âm thanh"""
+        entry = {'type': audio['type']}
+        if 'number' in audio:
+            entry['number'] = audio['number']
+        entry['path'] = audio['path']
+        entry['duration'] = audio['duration']
+        entry['content'] = audio['content']
+        entry['rel_path'] = rel_path
+        return entry
+    
+    def _update_payload_template(self):
+        """Dựng sẵn các trường cố định của payload TTS, chỉ còn thay văn bản mỗi lần gọi"""
+        self._payload_template = {
+            "model": self.model,
+            "voice": self.voice,
+            "response_format": self.response_format
+        }
     
     def set_voice(self, voice):
         """Thiết lập giọng đọc"""
         valid_voices = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
         if voice in valid_voices:
             self.voice = voice
-            logger.info(f"Đã thiết lập giọng đọc: {voice}")
+            self._update_payload_template()
+            logger.info("Đã thiết lập giọng đọc: %s", voice)
         else:
-            logger.warning(f"Giọng không hợp lệ: {voice}. Sử dụng giọng mặc định: {self.voice}")
+            logger.warning("Giọng không hợp lệ: %s. Sử dụng giọng mặc định: %s", voice, self.voice)
     
     def set_model(self, model):
         """Thiết lập model TTS"""
         valid_models = ["tts-1", "tts-1-hd"]
         if model in valid_models:
             self.model = model
-            logger.info(f"Đã thiết lập model: {model}")
+            self._update_payload_template()
+            logger.info("Đã thiết lập model: %s", model)
         else:
-            logger.warning(f"Model không hợp lệ: {model}. Sử dụng model mặc định: {self.model}")
+            logger.warning("Model không hợp lệ: %s. Sử dụng model mặc định: %s", model, self.model)
 
 # Test module nếu chạy trực tiếp
 if __name__ == "__main__":